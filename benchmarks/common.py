@@ -0,0 +1,94 @@
+"""
+Shared set-up, timing and result files for the benchmark scripts
+
+Results are written as JSON with the environment they were measured in
+(commit, versions, database, data set size), so runs can be compared over
+time with benchmarks/compare.py.
+"""
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django(**environment):
+    """Configure Django in this process; keyword arguments override the environment"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'issue_tracker.settings')
+    os.environ.update(environment)
+    sys.path.insert(0, str(ROOT))
+    import django
+    django.setup()
+
+
+def measure(func, repeat, warmup=1, items=1):
+    """Call func warmup + repeat times and summarize the timed calls"""
+    for _ in range(warmup):
+        func()
+    seconds = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - began)
+    return summarize(seconds, items)
+
+
+def summarize(seconds, items=1):
+    """
+    Latency statistics for a list of timings in seconds
+
+    items is the number of operations done by each timed call, for
+    per_second in batch benchmarks.
+    """
+    ordered = sorted(seconds)
+    return {
+        'runs': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': statistics.median(ordered) * 1000,
+        'p95_ms': ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000,
+        'min_ms': ordered[0] * 1000,
+        'max_ms': ordered[-1] * 1000,
+        'per_second': items * len(ordered) / sum(ordered) if sum(ordered) else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, check=True, capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Where and on what data the benchmark ran"""
+    import django
+    from django.db import connection
+    from issues.models import Comment, Issue, IssueUpdate
+
+    return {
+        'commit': _git_commit(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'database': connection.vendor,
+        'issues': Issue.objects.count(),
+        'updates': IssueUpdate.objects.count(),
+        'comments': Comment.objects.count(),
+    }
+
+
+def write_json(path, benchmark, results):
+    """Write results with the environment, in the format compare.py reads"""
+    Path(path).write_text(json.dumps(
+        {'benchmark': benchmark, 'environment': environment(), 'results': results},
+        indent=2, default=str,
+    ))
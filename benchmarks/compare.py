@@ -0,0 +1,92 @@
+"""
+Compare two benchmark result files
+
+Matches results by name and prints the change in median and p95 latency
+between a baseline and a new run of endpoints.py or micro.py, flagging
+changes larger than --threshold. For endpoints, changes in the number of
+database queries and in the response status are shown too; they are
+exact, unlike timings.
+
+Usage:
+    python benchmarks/compare.py before.json after.json
+    python benchmarks/compare.py before.json after.json --threshold 0.2 --fail-on-regression
+"""
+import argparse
+import json
+from pathlib import Path
+
+
+def load(path):
+    data = json.loads(Path(path).read_text())
+    return data, {result['name']: result for result in data['results']}
+
+
+def change(before, after):
+    if not before:
+        return None
+    return (after - before) / before
+
+
+def compare(before, after, threshold):
+    """Rows of (name, p50 before, p50 after, p50 change, p95 change, queries, flag)"""
+    rows = []
+    for name, new in after.items():
+        old = before.get(name)
+        if old is None:
+            rows.append((name, None, new['p50_ms'], None, None, '', 'new'))
+            continue
+        p50 = change(old['p50_ms'], new['p50_ms'])
+        p95 = change(old['p95_ms'], new['p95_ms'])
+        queries = ''
+        if old.get('queries') != new.get('queries'):
+            queries = f"{old.get('queries')} -> {new.get('queries')}"
+        flag = ''
+        if p50 is not None and p50 > threshold or queries and (new.get('queries') or 0) > (old.get('queries') or 0):
+            flag = 'slower'
+        elif p50 is not None and p50 < -threshold:
+            flag = 'faster'
+        if old.get('status') != new.get('status'):
+            flag = f"status {old.get('status')} -> {new.get('status')}"
+        rows.append((name, old['p50_ms'], new['p50_ms'], p50, p95, queries, flag))
+    rows.extend((name, old['p50_ms'], None, None, None, '', 'removed') for name, old in before.items() if name not in after)
+    return rows
+
+
+def _percent(value):
+    return f'{value:+7.1%}' if value is not None else '       '
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('before', help='Baseline results')
+    parser.add_argument('after', help='New results')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative change to flag (default 0.1)')
+    parser.add_argument(
+        '--fail-on-regression', action='store_true',
+        help='Exit with status 1 if anything got slower or changed status',
+    )
+    args = parser.parse_args()
+
+    before_data, before = load(args.before)
+    after_data, after = load(args.after)
+    for label, data in (('before', before_data), ('after', after_data)):
+        environment = data['environment']
+        print(
+            f"{label:>6}: {environment['commit']} {environment['timestamp']} {environment['database']}, "
+            f"{environment['issues']} issues, Python {environment['python']}, Django {environment['django']}"
+        )
+    if before_data['environment']['issues'] != after_data['environment']['issues']:
+        print('Warning: the runs used different data sets')
+
+    rows = compare(before, after, args.threshold)
+    for name, old, new, p50, p95, queries, flag in rows:
+        old_text = f'{old:9.2f}' if old is not None else ' ' * 9
+        new_text = f'{new:9.2f}' if new is not None else ' ' * 9
+        print(f'{name:<55} p50 {old_text} -> {new_text} ms {_percent(p50)}  p95 {_percent(p95)}  {queries:<10} {flag}')
+
+    if args.fail_on_regression and any(row[-1] == 'slower' or row[-1].startswith('status') for row in rows):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Request-level benchmarks of every page and API endpoint
+
+Sends GET requests through the full Django stack (middleware, views,
+templates) with the test client, logged in as a citizen, worker or admin
+where the view needs one, and reports latency, status, database queries
+(from the X-DB-Queries header) and response size per URL. Every URL in
+issues/urls.py and issues/api_urls.py must have at least one case in
+CASES, so new endpoints are not left out. Seed a database first, e.g. with
+`python manage.py seed_benchmark_data --issues 100000`.
+
+The page cache is off unless --cache is given, so views are measured
+rather than cache hits.
+
+Usage:
+    python benchmarks/endpoints.py --repeat 20
+    python benchmarks/endpoints.py --only api_ --json endpoints.json
+"""
+import argparse
+import datetime
+import math
+import time
+
+from common import setup_django, summarize, write_json
+
+# Viewport for the map API around the sample issue, in degrees
+MAP_VIEWPORT_DEGREES = 0.05
+# Location used when no issue has coordinates (Bengaluru)
+DEFAULT_LOCATION = (12.9716, 77.5946)
+
+
+def _tile(zoom):
+    """Path parameters of the Web Mercator tile holding the sample location"""
+    def kwargs(data):
+        latitude, longitude = data['location']
+        scale = 2 ** zoom
+        x = int((longitude + 180) / 360 * scale)
+        y = int((1 - math.asinh(math.tan(math.radians(latitude))) / math.pi) / 2 * scale)
+        return {'zoom': zoom, 'x': x, 'y': y}
+    return kwargs
+
+
+def _issue(data):
+    return {'issue_id': data['issue_id']}
+
+
+def _bbox(data):
+    latitude, longitude = data['location']
+    delta = MAP_VIEWPORT_DEGREES
+    return {'bbox': f'{latitude - delta},{longitude - delta},{latitude + delta},{longitude + delta}'}
+
+
+def _last_two_years(data):
+    start = datetime.date.today() - datetime.timedelta(days=730)
+    return {'interval': 'month', 'start': start.isoformat()}
+
+
+def _no_kwargs(data):
+    return {}
+
+
+# (URL name, label, query parameters, role, path parameters); callables
+# get the sample data chosen by sample_data()
+CASES = [
+    ('home', '', {}, None, _no_kwargs),
+    ('issue_list', '', {}, None, _no_kwargs),
+    ('issue_list', 'filtered', {'category': 'pothole', 'status': 'pending'}, None, _no_kwargs),
+    ('issue_list', 'search', {'q': 'street light'}, None, _no_kwargs),
+    ('issue_create', '', {}, 'citizen', _no_kwargs),
+    ('issue_detail', '', {}, None, _issue),
+    ('my_issues', '', {}, 'citizen', _no_kwargs),
+    ('resolved_gallery', '', {}, None, _no_kwargs),
+    ('map', '', {}, None, _no_kwargs),
+    ('admin_dashboard', '', {}, 'admin', _no_kwargs),
+    ('admin_manage_issue', '', {}, 'admin', _issue),
+    ('api_issue_list', '', {}, None, _no_kwargs),
+    ('api_issue_list', 'filtered', {'category': 'pothole', 'status': 'pending'}, None, _no_kwargs),
+    ('api_issue_list', 'ndjson', {'format': 'ndjson', 'category': 'electricity'}, None, _no_kwargs),
+    ('api_issue_search', '', {'q': 'pothole bus stop'}, None, _no_kwargs),
+    ('api_issue_search', 'filtered', {'q': 'leak', 'status': 'pending'}, None, _no_kwargs),
+    ('api_issue_map', '', _bbox, None, _no_kwargs),
+    ('api_map_tile', 'zoom 6', {}, None, _tile(6)),
+    ('api_map_tile', 'zoom 12', {}, None, _tile(12)),
+    ('api_map_tile', 'zoom 17', {}, None, _tile(17)),
+    ('api_issue_detail', '', {}, None, _issue),
+    ('api_sync', '', {}, 'worker', _no_kwargs),
+    ('api_stats', '', {}, None, _no_kwargs),
+    ('api_stats_timeseries', '', {}, None, _no_kwargs),
+    ('api_stats_timeseries', 'monthly', _last_two_years, None, _no_kwargs),
+]
+
+
+def check_coverage():
+    """Fail when a URL of the issues app has no benchmark case"""
+    from issues import api_urls, urls
+
+    names = {pattern.name for module in (urls, api_urls) for pattern in module.urlpatterns}
+    missing = names - {name for name, *_ in CASES}
+    if missing:
+        raise SystemExit(f"No benchmark case for {', '.join(sorted(missing))}; add them to CASES")
+
+
+def sample_data():
+    """Issue, location and users the requests are made with"""
+    from django.db.models import Count, Q
+    from accounts.models import User
+    from issues.models import Issue
+
+    # The issue with the most comments makes the heaviest detail page
+    issue = (
+        Issue.objects.annotate(comment_count=Count('comments'))
+        .order_by('-comment_count', 'pk').values('issue_id', 'latitude', 'longitude', 'user_id').first()
+    )
+    if issue is None:
+        raise SystemExit('No issues; run `python manage.py seed_benchmark_data` first')
+    located = (issue['latitude'], issue['longitude']) if issue['latitude'] is not None else (
+        Issue.objects.filter(latitude__isnull=False).values_list('latitude', 'longitude').first()
+    )
+    worker = (
+        User.objects.filter(role='worker').annotate(assigned=Count('assigned_issues'))
+        .order_by('-assigned', 'pk').first()
+    )
+    return {
+        'issue_id': issue['issue_id'],
+        'location': tuple(map(float, located)) if located else DEFAULT_LOCATION,
+        'users': {
+            'citizen': User.objects.get(pk=issue['user_id']),
+            'worker': worker,
+            'admin': User.objects.filter(Q(role='admin') | Q(is_staff=True)).order_by('pk').first(),
+        },
+    }
+
+
+def request(client, url, params):
+    """GET url and read the whole response; returns (seconds, response, size in bytes)"""
+    began = time.perf_counter()
+    response = client.get(url, params)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return time.perf_counter() - began, response, size
+
+
+def run_case(client, url, params, repeat, warmup):
+    for _ in range(warmup):
+        request(client, url, params)
+    seconds, queries = [], []
+    for _ in range(repeat):
+        elapsed, response, size = request(client, url, params)
+        seconds.append(elapsed)
+        if 'X-DB-Queries' in response:
+            queries.append(int(response['X-DB-Queries']))
+    return dict(
+        summarize(seconds),
+        status=response.status_code,
+        bytes=size,
+        queries=max(queries) if queries else None,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20, help='Timed requests per case')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per case')
+    parser.add_argument('--only', help='Run only cases whose name contains this text')
+    parser.add_argument('--cache', action='store_true', help='Leave the page cache on')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    environment = {'DEBUG': 'False', 'INSTRUMENTATION_ENABLED': 'True'}
+    if not args.cache:
+        environment['VIEW_CACHE_SECONDS'] = '0'
+    setup_django(**environment)
+    from django.test import Client
+    from django.urls import reverse
+
+    check_coverage()
+    data = sample_data()
+    clients = {None: Client()}
+    for role, user in data['users'].items():
+        clients[role] = Client()
+        if user is not None:
+            clients[role].force_login(user)
+
+    results = []
+    for url_name, label, params, role, kwargs in CASES:
+        name = f'{url_name}[{label}]' if label else url_name
+        if args.only and args.only not in name:
+            continue
+        if data['users'].get(role, True) is None:
+            print(f'{name:<40} skipped: no {role} user')
+            continue
+        url = reverse(url_name, kwargs=kwargs(data))
+        query = params(data) if callable(params) else params
+        stats = run_case(clients[role], url, query, args.repeat, args.warmup)
+        results.append(dict(name=name, url=url, params=query, role=role, **stats))
+        print(
+            f"{name:<40} {stats['status']}  p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+            f"{stats['queries'] if stats['queries'] is not None else '-':>3} queries  {stats['bytes']:>9} bytes"
+        )
+    if args.json:
+        write_json(args.json, 'endpoints', results)
+
+
+if __name__ == '__main__':
+    main()
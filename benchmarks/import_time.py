@@ -0,0 +1,81 @@
+"""
+Cold-start benchmark for issue_tracker.wsgi
+
+Starts a fresh interpreter for every run, imports the WSGI application and
+loads the URLconf (what a worker does before serving its first request),
+then reports wall time, peak RSS and which heavy libraries were imported.
+Runs once with the AI utilities loaded lazily and once with AI_PRELOAD.
+
+Usage:
+    python benchmarks/import_time.py --runs 10
+    python benchmarks/import_time.py --json import_time.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ['numpy', 'scipy', 'sklearn', 'issues.ai_utils']
+
+CHILD = f"""
+import json, resource, sys, time
+start = time.perf_counter()
+import issue_tracker.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'loaded': [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def cold_start(preload):
+    env = dict(os.environ, AI_PRELOAD='True' if preload else 'False')
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'issue_tracker.settings')
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD], cwd=ROOT, env=env,
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(preload, runs):
+    samples = [cold_start(preload) for _ in range(runs)]
+    seconds = [sample['seconds'] for sample in samples]
+    return {
+        'mode': 'preload' if preload else 'lazy',
+        'runs': runs,
+        'median_seconds': statistics.median(seconds),
+        'min_seconds': min(seconds),
+        'max_rss_kb': max(sample['max_rss_kb'] for sample in samples),
+        'loaded': samples[-1]['loaded'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    results = [measure(preload, args.runs) for preload in (False, True)]
+    for result in results:
+        print(
+            f"{result['mode']:>8}: median {result['median_seconds'] * 1000:.0f} ms, "
+            f"min {result['min_seconds'] * 1000:.0f} ms, peak RSS {result['max_rss_kb'] / 1024:.0f} MiB, "
+            f"loaded: {', '.join(result['loaded']) or 'none'}"
+        )
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
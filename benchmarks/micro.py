@@ -0,0 +1,127 @@
+"""
+Micro-benchmarks of the AI utilities on the issues in the database
+
+Times DuplicateDetector (pairwise TF-IDF comparison and the persistent
+similarity index), ToxicityFilter and PriorityClassifier on texts sampled
+from the database, one call at a time and in batches. Seed a database
+first, e.g. with `python manage.py seed_benchmark_data --issues 100000`.
+For batch cases per_second counts texts, not calls.
+
+Usage:
+    python benchmarks/micro.py --repeat 200
+    python benchmarks/micro.py --only toxicity --json micro.json
+"""
+import argparse
+import itertools
+import random
+
+from common import measure, setup_django, write_json
+
+BATCH_SIZE = 1000
+PAIRWISE_CANDIDATES = (50, 500)
+SAMPLE_SIZE = 5000
+
+
+def load_samples(rng):
+    from issues import ai
+    from issues.models import Comment, Issue
+
+    issues = list(
+        Issue.objects.filter(status__in=Issue.OPEN_STATUSES)
+        .values_list('pk', 'category', 'title', 'description')[:SAMPLE_SIZE]
+    )
+    if not issues:
+        raise SystemExit('No open issues; run `python manage.py seed_benchmark_data` first')
+    comments = list(Comment.objects.values_list('text', flat=True)[:SAMPLE_SIZE]) or ['Any update on this?']
+    rng.shuffle(issues)
+    return {
+        'issues': [
+            (pk, category, ai.PriorityClassifier.issue_text(title, description))
+            for pk, category, title, description in issues
+        ],
+        'comments': comments,
+    }
+
+
+def cases(samples):
+    """(name, func, texts handled per call) for every benchmark"""
+    from issues import ai
+
+    issues, comments = samples['issues'], samples['comments']
+    texts = [text for _, _, text in issues]
+    next_issue = itertools.cycle(issues).__next__
+    next_comment = itertools.cycle(comments).__next__
+    batch = (texts * (BATCH_SIZE // len(texts) + 1))[:BATCH_SIZE]
+    comment_batch = (comments * (BATCH_SIZE // len(comments) + 1))[:BATCH_SIZE]
+
+    for candidates in PAIRWISE_CANDIDATES:
+        existing = [{'id': pk, 'text': text} for pk, _, text in issues[:candidates]]
+        yield (
+            f'duplicate_detector.find_similar_issues[{len(existing)} candidates]',
+            lambda existing=existing: ai.DuplicateDetector.find_similar_issues(next_issue()[2], existing),
+            1,
+        )
+
+    def find_similar_indexed():
+        pk, category, text = next_issue()
+        ai.DuplicateDetector.find_similar_indexed(text, category, exclude_ids=[pk])
+
+    yield 'duplicate_detector.find_similar_indexed', find_similar_indexed, 1
+
+    category = issues[0][1]
+    category_texts = [text for _, issue_category, text in issues if issue_category == category]
+    yield (
+        f'similarity_index.query_many[{len(category_texts)}]',
+        lambda: ai.get_similarity_index(category).query_many(category_texts, threshold=0.6),
+        len(category_texts),
+    )
+
+    yield 'toxicity_filter.is_toxic', lambda: ai.ToxicityFilter.is_toxic(next_comment()), 1
+    yield (
+        f'toxicity_filter.is_toxic_batch[{BATCH_SIZE}]',
+        lambda: ai.ToxicityFilter.is_toxic_batch(comment_batch),
+        BATCH_SIZE,
+    )
+
+    def suggest_priority():
+        _, _, text = next_issue()
+        ai.PriorityClassifier.suggest_priority(text, '')
+
+    yield 'priority_classifier.suggest_priority', suggest_priority, 1
+    yield (
+        f'priority_classifier.suggest_priorities[{BATCH_SIZE}]',
+        lambda: ai.PriorityClassifier.suggest_priorities(batch),
+        BATCH_SIZE,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200, help='Timed calls per single-text case')
+    parser.add_argument('--batch-repeat', type=int, default=10, help='Timed calls per batch case')
+    parser.add_argument('--only', help='Run only cases whose name contains this text')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    setup_django()
+    rng = random.Random(args.seed)
+    samples = load_samples(rng)
+
+    results = []
+    for name, func, items in cases(samples):
+        if args.only and args.only not in name:
+            continue
+        repeat = args.repeat if items == 1 else args.batch_repeat
+        stats = measure(func, repeat, items=items)
+        results.append(dict(name=name, items=items, **stats))
+        print(
+            f"{name:<55} p50 {stats['p50_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms  "
+            f"{stats['per_second']:12.1f} texts/s"
+        )
+    if args.json:
+        write_json(args.json, 'micro', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+Concurrent read/write throughput of SQLite under each DATABASE_PROFILE
+
+Seeds a scratch database, then starts reader and writer processes that run
+against it for a fixed time. Readers request the issue list, issue detail
+and stats APIs through the full Django stack; writers change issue statuses
+(a read-then-write transaction) and post comments. Reports operations per
+second, latency percentiles and writes that failed with "database is
+locked" for the default and production profiles.
+
+Usage:
+    python benchmarks/sqlite_concurrency.py --readers 4 --writers 2 --seconds 10
+    python benchmarks/sqlite_concurrency.py --json sqlite_concurrency.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROFILES = ['default', 'production']
+
+
+def setup_django(profile, workdir):
+    """Configure Django in this process for the profile's scratch database"""
+    os.environ.update(
+        DJANGO_SETTINGS_MODULE='issue_tracker.settings',
+        DATABASE_PROFILE=profile,
+        DEBUG='False',
+        VIEW_CACHE_SECONDS='0',
+        INSTRUMENTATION_ENABLED='False',
+        SIMILARITY_INDEX_DIR=str(Path(workdir) / 'similarity_index'),
+    )
+    sys.path.insert(0, str(ROOT))
+    import django
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = str(Path(workdir) / 'db.sqlite3')
+    django.setup()
+
+
+def seed(profile, workdir, issues):
+    setup_django(profile, workdir)
+    from django.core.management import call_command
+    from django.db import transaction
+    from accounts.models import User
+    from issues.models import Issue
+
+    call_command('migrate', verbosity=0)
+    user = User.objects.create_user('benchmark', password='benchmark')
+    with transaction.atomic():
+        for number in range(issues):
+            Issue.objects.create(
+                user=user, title=f'Benchmark issue {number}', category=random.choice(Issue.CATEGORY_CHOICES)[0],
+                description='Pothole near the bus stop ' * 5, address=f'{number} Main Street',
+                latitude=12.9 + random.random() / 10, longitude=77.5 + random.random() / 10,
+            )
+
+
+def reader(profile, workdir, start, seconds, results):
+    setup_django(profile, workdir)
+    from django.test import Client
+    from issues.models import Issue
+
+    issue_ids = list(Issue.objects.values_list('issue_id', flat=True))
+    client = Client()
+    urls = ['/api/issues/', '/api/stats/']
+    latencies, failures = [], 0
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        url = random.choice(urls + [f'/api/issues/{random.choice(issue_ids)}/'])
+        began = time.perf_counter()
+        if client.get(url).status_code != 200:
+            failures += 1
+        latencies.append(time.perf_counter() - began)
+    results.put(('read', latencies, failures))
+
+
+def writer(profile, workdir, start, seconds, results):
+    setup_django(profile, workdir)
+    from django.db import close_old_connections
+    from issues import ai, database
+    from issues.models import Comment, Issue
+
+    pks = list(Issue.objects.values_list('pk', flat=True))
+    user_id = Issue.objects.values_list('user_id', flat=True).first()
+    # Status changes update the similarity indexes; load them before timing
+    for category, _ in Issue.CATEGORY_CHOICES:
+        ai.get_similarity_index(category)
+    latencies, failures = [], 0
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        try:
+            if random.random() < 0.5:
+                issue = Issue.objects.get(pk=random.choice(pks))
+                issue.status = 'in_progress' if issue.status == 'pending' else 'pending'
+                issue.save()
+            else:
+                Comment.objects.create(issue_id=random.choice(pks), user_id=user_id, text='Seen it too')
+        except Exception as exc:
+            if not database.is_locked_error(exc):
+                raise
+            failures += 1
+        latencies.append(time.perf_counter() - began)
+        # Writers stand in for requests: connections follow CONN_MAX_AGE
+        close_old_connections()
+    results.put(('write', latencies, failures))
+
+
+def summarize(latencies, failures, seconds):
+    ordered = sorted(latencies)
+    return {
+        'operations': len(ordered),
+        'per_second': len(ordered) / seconds,
+        'p50_ms': statistics.median(ordered) * 1000 if ordered else None,
+        'p95_ms': ordered[int(len(ordered) * 0.95)] * 1000 if ordered else None,
+        'locked_errors': failures,
+    }
+
+
+def measure(profile, readers, writers, seconds, issues):
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as workdir:
+        process = context.Process(target=seed, args=(profile, workdir, issues))
+        process.start()
+        process.join()
+        if process.exitcode:
+            raise SystemExit(f'Seeding the {profile} database failed')
+
+        start, results = context.Event(), context.Queue()
+        workers = [
+            context.Process(target=target, args=(profile, workdir, start, seconds, results))
+            for target, count in ((reader, readers), (writer, writers)) for _ in range(count)
+        ]
+        for worker in workers:
+            worker.start()
+        # Give every worker time to import Django before the clock starts
+        time.sleep(3)
+        start.set()
+        collected = {'read': ([], 0), 'write': ([], 0)}
+        for _ in workers:
+            kind, latencies, failures = results.get()
+            collected[kind] = (collected[kind][0] + latencies, collected[kind][1] + failures)
+        for worker in workers:
+            worker.join()
+
+    return {
+        'profile': profile,
+        'readers': readers,
+        'writers': writers,
+        'seconds': seconds,
+        'read': summarize(*collected['read'], seconds),
+        'write': summarize(*collected['write'], seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--issues', type=int, default=500, help='Issues to seed')
+    parser.add_argument('--profile', choices=PROFILES, action='append', help='Profile to run (default: all)')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    results = [
+        measure(profile, args.readers, args.writers, args.seconds, args.issues)
+        for profile in args.profile or PROFILES
+    ]
+    for result in results:
+        for kind in ('read', 'write'):
+            stats = result[kind]
+            print(
+                f"{result['profile']:>10} {kind:>5}: {stats['per_second']:8.1f} ops/s, "
+                f"p50 {stats['p50_ms'] or 0:.1f} ms, p95 {stats['p95_ms'] or 0:.1f} ms, "
+                f"locked {stats['locked_errors']}"
+            )
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
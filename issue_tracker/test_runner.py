@@ -0,0 +1,42 @@
+"""
+Test runner that keeps test runs out of the data directory
+The similarity indexes, the trained priority model and the file cache live
+under data/. For the whole run they point at a temporary directory, which
+is removed afterwards, so tests never read or overwrite them. Subprocesses
+started by tests get the same locations through the environment.
+"""
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+FILE_CACHE = 'django.core.cache.backends.filebased.FileBasedCache'
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._data_dir = tempfile.TemporaryDirectory(prefix='issue-tracker-tests-')
+        data = Path(self._data_dir.name)
+        overrides = {
+            'SIMILARITY_INDEX_DIR': data / 'similarity_index',
+            'PRIORITY_MODEL_PATH': data / 'priority_model.joblib',
+        }
+        environment = {name: str(value) for name, value in overrides.items()}
+        if settings.CACHES['default']['BACKEND'] == FILE_CACHE:
+            overrides['CACHES'] = {'default': dict(settings.CACHES['default'], LOCATION=str(data / 'cache'))}
+            environment['CACHE_LOCATION'] = str(data / 'cache')
+        self._data_settings = override_settings(**overrides)
+        self._data_settings.enable()
+        self._data_environment = mock.patch.dict(os.environ, environment)
+        self._data_environment.start()
+
+    def teardown_test_environment(self, **kwargs):
+        self._data_environment.stop()
+        self._data_settings.disable()
+        self._data_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
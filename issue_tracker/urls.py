@@ -6,12 +6,15 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
+from issues.instrumentation import metrics_view
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # Before the Django admin, whose catch-all would hide admin/issues/<id>/manage/
     path('', include('issues.urls')),
+    path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
     path('api/', include('issues.api_urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files in development
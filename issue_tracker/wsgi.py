@@ -4,8 +4,15 @@ WSGI config for issue_tracker project.
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'issue_tracker.settings')
 
 application = get_wsgi_application()
+
+if settings.AI_PRELOAD:
+    # With gunicorn --preload this runs once in the master process and the
+    # loaded models are shared copy-on-write by the forked workers
+    from issues import ai
+    ai.preload()
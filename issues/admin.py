@@ -8,7 +8,10 @@ class IssueAdmin(admin.ModelAdmin):
     list_display = ['issue_id', 'title', 'category', 'status', 'urgency_level', 'user', 'created_at']
     list_filter = ['status', 'category', 'urgency_level', 'created_at']
     search_fields = ['title', 'description', 'issue_id', 'user__username']
-    readonly_fields = ['issue_id', 'created_at', 'updated_at', 'resolved_at']
+    readonly_fields = [
+        'issue_id', 'created_at', 'updated_at', 'resolved_at',
+        'suggested_priority', 'duplicate_candidates', 'ai_processed_at',
+    ]
     list_per_page = 25
     
     fieldsets = (
@@ -27,6 +30,9 @@ class IssueAdmin(admin.ModelAdmin):
         ('Timestamps', {
             'fields': ('created_at', 'updated_at', 'resolved_at')
         }),
+        ('AI Analysis', {
+            'fields': ('suggested_priority', 'duplicate_candidates', 'ai_processed_at')
+        }),
     )
 
 
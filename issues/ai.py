@@ -0,0 +1,62 @@
+"""
+Lazy entry point to the AI utilities
+
+Importing scikit-learn and SciPy dominates worker start-up time and memory,
+so request-serving modules reach the AI classes through this facade instead
+of importing issues.ai_utils directly. The heavy modules are imported the
+first time an attribute is used, e.g. ``ai.ToxicityFilter.is_toxic(text)``.
+
+Set AI_PRELOAD=True when running ``gunicorn --preload`` to import and warm
+everything in the master process so forked workers share it copy-on-write.
+"""
+import gc
+import importlib
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    'DuplicateDetector', 'PriorityClassifier', 'SimilarityIndex', 'ToxicityFilter',
+    'get_similarity_index', 'is_loaded', 'preload',
+]
+
+_LAZY_ATTRIBUTES = {
+    'DuplicateDetector', 'PriorityClassifier', 'SimilarityIndex', 'ToxicityFilter',
+    'get_similarity_index',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module('issues.ai_utils'), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def is_loaded():
+    """Whether the AI utilities have been imported in this process"""
+    return 'issues.ai_utils' in sys.modules
+
+
+def preload():
+    """
+    Import the AI utilities and load their shared state up front
+    
+    Compiles the toxicity and keyword patterns, loads the priority model and
+    every category similarity index, then freezes the garbage collector so
+    the loaded objects are not dirtied (and copied) by collections in forked
+    workers. Does not touch the database.
+    """
+    from .models import Issue
+    ai_utils = importlib.import_module('issues.ai_utils')
+
+    ai_utils.ToxicityFilter.get_pattern()
+    ai_utils.PriorityClassifier.get_keyword_pattern()
+    ai_utils.PriorityClassifier.get_model()
+    for category, _ in Issue.CATEGORY_CHOICES:
+        ai_utils.get_similarity_index(category)
+    # Warm the vectorizer code paths once so first requests do not pay for it
+    ai_utils.SimilarityIndex.vectorize(['warm up'])
+
+    gc.freeze()
+    logger.info('AI utilities preloaded')
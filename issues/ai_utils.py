@@ -2,14 +2,34 @@
 AI utilities for issue tracking
 Includes duplicate detection and toxicity filtering
 """
-from sklearn.feature_extraction.text import TfidfVectorizer
+from contextlib import contextmanager
+from pathlib import Path
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads are serialised
+    fcntl = None
+
+from django.conf import settings
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+import numpy as np
 import re
 
+from .geo import haversine_km
+
 
 class DuplicateDetector:
     """Detect duplicate issues using TF-IDF and cosine similarity"""
     
+    # Issues further apart than this are never considered duplicates
+    MAX_DISTANCE_KM = 1.0
+    
     @staticmethod
     def find_similar_issues(new_issue_text, existing_issues, threshold=0.6):
         """
@@ -53,7 +73,7 @@ class DuplicateDetector:
             return []
     
     @staticmethod
-    def check_location_proximity(lat1, lon1, lat2, lon2, max_distance_km=1.0):
+    def check_location_proximity(lat1, lon1, lat2, lon2, max_distance_km=MAX_DISTANCE_KM):
         """
         Check if two locations are within proximity
         Uses Haversine formula
@@ -66,23 +86,342 @@ class DuplicateDetector:
         Returns:
             Boolean indicating if locations are close
         """
-        from math import radians, sin, cos, sqrt, atan2
+        distance = haversine_km(float(lat1), float(lon1), float(lat2), float(lon2))
         
-        # Convert to radians
-        lat1, lon1, lat2, lon2 = map(radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
+        return bool(distance <= max_distance_km)
+    
+    @staticmethod
+    def find_similar_indexed(new_issue_text, category, threshold=0.6, top_k=5,
+                             exclude_ids=None, candidate_ids=None):
+        """
+        Find similar open issues using the persistent per-category index
         
-        # Haversine formula
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        distance = 6371 * c  # Earth radius in km
+        Args:
+            new_issue_text: Text of the new issue (title + description)
+            category: Issue category to search in
+            threshold: Similarity threshold (0-1)
+            top_k: Maximum number of matches to return
+            exclude_ids: Issue primary keys to leave out of the results
+            candidate_ids: Only score these issue primary keys, e.g. the
+                result of a spatial lookup
         
-        return distance <= max_distance_km
+        Returns:
+            List of (issue pk, similarity) tuples, most similar first
+        """
+        index = get_similarity_index(category)
+        return index.query(
+            new_issue_text, top_k=top_k, threshold=threshold,
+            exclude_ids=exclude_ids, candidate_ids=candidate_ids,
+        )
+
+
+class SimilarityIndex:
+    """
+    Persistent TF-IDF index over the open issues of one category
+    
+    Texts are hashed into a fixed feature space, so issues can be added or
+    removed without refitting a vocabulary. Raw term counts are stored on
+    disk and IDF weights are recomputed lazily after the index changes.
+    
+    Several processes share the file. Changes are made under an exclusive
+    lock on a sidecar .lock file: the current file is reloaded, the change
+    applied and the file replaced, so no process overwrites another's
+    additions. Changes made with save=False are kept and replayed on top
+    of whatever other processes saved in the meantime.
+    """
+    
+    N_FEATURES = 2 ** 18
+    
+    _vectorizer = HashingVectorizer(
+        n_features=N_FEATURES, stop_words='english', alternate_sign=False, norm=None
+    )
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+        self._lock = threading.RLock()
+        self._version = None
+        # Changes not saved yet, as ('add' or 'remove', pks, counts)
+        self._pending = []
+        self._reset()
+        self._load()
+    
+    def __len__(self):
+        return len(self._ids)
+    
+    def __contains__(self, pk):
+        return bool(np.any(self._ids == pk))
+    
+    def _reset(self):
+        self._ids = np.empty(0, dtype=np.int64)
+        self._counts = sparse.csr_matrix((0, self.N_FEATURES), dtype=np.float64)
+        self._invalidate()
+    
+    def _invalidate(self):
+        self._idf = None
+        self._weighted = None
+    
+    def _file_version(self):
+        # Every save replaces the file, so the inode tells writes apart
+        # even within one tick of the file system clock
+        stat = self.path.stat()
+        return stat.st_mtime_ns, stat.st_ino, stat.st_size
+    
+    def _load(self):
+        """Load the index from disk if the file changed since the last load"""
+        try:
+            version = self._file_version()
+        except FileNotFoundError:
+            if self._version is not None:
+                self._version = None
+                self._reset()
+                self._replay()
+            return
+        if version == self._version:
+            return
+        with np.load(self.path) as data:
+            self._ids = data['ids']
+            self._counts = sparse.csr_matrix(
+                (data['data'], data['indices'], data['indptr']),
+                shape=(len(data['ids']), self.N_FEATURES),
+            )
+        self._version = version
+        self._invalidate()
+        self._replay()
+    
+    def _replay(self):
+        """Apply the unsaved changes again after loading another version"""
+        for change in self._pending:
+            self._apply(*change)
+    
+    @contextmanager
+    def _locked(self):
+        """Hold the index against other threads and, through the lock file, other processes"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _write(self):
+        """Atomically replace the file with the index; the caller holds _locked()"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                f,
+                ids=self._ids,
+                data=self._counts.data,
+                indices=self._counts.indices,
+                indptr=self._counts.indptr,
+            )
+        os.replace(tmp_path, self.path)
+        self._version = self._file_version()
+        self._pending = []
+    
+    def save(self):
+        """Write the unsaved changes to disk, on top of changes saved by other processes"""
+        with self._locked():
+            self._load()
+            self._write()
+    
+    def _change(self, action, pks, counts=None, save=True):
+        """Apply a change to the current version of the index and save it or keep it pending"""
+        with self._locked() if save else self._lock:
+            self._load()
+            changed = self._apply(action, pks, counts)
+            if save:
+                if changed:
+                    self._write()
+            else:
+                self._pending.append((action, pks, counts))
+    
+    @classmethod
+    def vectorize(cls, texts):
+        """Return the sparse term-count matrix for a list of texts"""
+        return cls._vectorizer.transform(texts).astype(np.float64)
+    
+    @classmethod
+    def document_frequency(cls, counts):
+        """Number of documents each hashed feature appears in"""
+        return np.bincount(counts.indices, minlength=cls.N_FEATURES)
+    
+    @staticmethod
+    def idf(document_frequency, n_documents):
+        """Smoothed inverse document frequency, as in TfidfTransformer"""
+        return np.log((1 + n_documents) / (1 + document_frequency)) + 1
+    
+    @staticmethod
+    def weight(counts, idf):
+        """Apply IDF weights and L2-normalise each row"""
+        return normalize(counts.multiply(idf).tocsr())
+    
+    def _weights(self):
+        if self._idf is None:
+            self._idf = self.idf(self.document_frequency(self._counts), len(self._ids))
+            self._weighted = self.weight(self._counts, self._idf)
+        return self._idf, self._weighted
+    
+    def _remove_rows(self, pks):
+        keep = ~np.isin(self._ids, pks)
+        if keep.all():
+            return False
+        self._ids = self._ids[keep]
+        self._counts = self._counts[keep]
+        return True
+    
+    def _apply(self, action, pks, counts):
+        """Apply an 'add' or 'remove' change in memory; returns whether anything changed"""
+        changed = self._remove_rows(pks)
+        if action == 'add':
+            self._ids = np.concatenate([self._ids, pks])
+            self._counts = sparse.vstack([self._counts, counts], format='csr')
+            changed = True
+        if changed:
+            self._invalidate()
+        return changed
+    
+    def add_many(self, rows, save=True):
+        """
+        Add or replace documents in the index
+        
+        Args:
+            rows: Iterable of (issue pk, text) pairs
+            save: Persist the index afterwards
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        pks = np.array([pk for pk, _ in rows], dtype=np.int64)
+        self._change('add', pks, self.vectorize([text for _, text in rows]), save=save)
+    
+    def add(self, pk, text):
+        self.add_many([(pk, text)])
+    
+    def remove(self, pk):
+        self._change('remove', np.array([pk], dtype=np.int64))
+    
+    def clear(self):
+        """
+        Remove the issues indexed so far; call save() to write it
+        
+        Issues other processes add before the save are kept.
+        """
+        with self._lock:
+            self._load()
+            self._change('remove', self._ids.copy(), save=False)
+    
+    def query(self, text, top_k=5, threshold=0.0, exclude_ids=None, candidate_ids=None):
+        """
+        Find the indexed documents most similar to a text
+        
+        Args:
+            text: Query text
+            top_k: Maximum number of matches to return
+            threshold: Minimum cosine similarity (0-1)
+            exclude_ids: Issue primary keys to leave out of the results
+            candidate_ids: Only score these issue primary keys
+        
+        Returns:
+            List of (issue pk, similarity) tuples, most similar first
+        """
+        with self._lock:
+            self._load()
+            if not len(self._ids):
+                return []
+            idf, weighted = self._weights()
+            ids = self._ids
+        
+        if candidate_ids is not None:
+            rows = np.flatnonzero(np.isin(ids, list(candidate_ids)))
+            ids, weighted = ids[rows], weighted[rows]
+            if not len(ids):
+                return []
+        
+        query_vector = self.weight(self.vectorize([text]), idf)
+        similarities = (weighted @ query_vector.T).toarray().ravel()
+        if exclude_ids:
+            similarities[np.isin(ids, list(exclude_ids))] = 0
+        
+        candidates = np.flatnonzero(similarities >= max(threshold, 1e-9))
+        if len(candidates) > top_k:
+            top = np.argpartition(-similarities[candidates], top_k - 1)[:top_k]
+            candidates = candidates[top]
+        order = candidates[np.argsort(-similarities[candidates], kind='stable')]
+        return [(int(ids[i]), float(similarities[i])) for i in order]
+    
+    def query_many(self, texts, top_k=5, threshold=0.0, exclude_ids=None, chunk_size=256):
+        """
+        Find the most similar indexed documents for many texts at once
+        
+        Args:
+            texts: Query texts
+            top_k: Maximum number of matches per text
+            threshold: Minimum cosine similarity (0-1)
+            exclude_ids: One issue primary key (or None) per text to leave
+                out of its results, e.g. the text's own issue
+            chunk_size: Texts scored per sparse matrix product
+        
+        Returns:
+            One list of (issue pk, similarity) tuples per text, most similar first
+        """
+        texts = list(texts)
+        exclude_ids = list(exclude_ids) if exclude_ids is not None else [None] * len(texts)
+        with self._lock:
+            self._load()
+            if not len(self._ids):
+                return [[] for _ in texts]
+            idf, weighted = self._weights()
+            ids = self._ids
+        
+        results = []
+        for start in range(0, len(texts), chunk_size):
+            query_vectors = self.weight(self.vectorize(texts[start:start + chunk_size]), idf)
+            # Sparse product, so memory follows the number of shared terms
+            similarities = (query_vectors @ weighted.T).tocsr()
+            for row, exclude in enumerate(exclude_ids[start:start + chunk_size]):
+                begin, end = similarities.indptr[row], similarities.indptr[row + 1]
+                columns, values = similarities.indices[begin:end], similarities.data[begin:end]
+                keep = values >= max(threshold, 1e-9)
+                if exclude is not None:
+                    keep &= ids[columns] != exclude
+                columns, values = columns[keep], values[keep]
+                if len(values) > top_k:
+                    top = np.argpartition(-values, top_k - 1)[:top_k]
+                    columns, values = columns[top], values[top]
+                order = np.argsort(-values, kind='stable')
+                results.append([(int(ids[columns[i]]), float(values[i])) for i in order])
+        return results
+
+
+_similarity_indexes = {}
+_similarity_indexes_lock = threading.Lock()
+
+
+def get_similarity_index(category):
+    """Return the shared similarity index for a category"""
+    path = Path(settings.SIMILARITY_INDEX_DIR) / f'{category}.npz'
+    with _similarity_indexes_lock:
+        if path not in _similarity_indexes:
+            _similarity_indexes[path] = SimilarityIndex(path)
+        return _similarity_indexes[path]
 
 
 class ToxicityFilter:
-    """Simple toxicity filter for comments"""
+    """
+    Simple toxicity filter for comments
+    
+    All lexicon words are compiled into one case-insensitive alternation
+    with word boundaries, so each text is scanned once. The lexicon is read
+    from TOXICITY_LEXICON_PATH when set (one word per line, '#' comments)
+    and reloaded automatically when that file changes.
+    """
     
     # List of toxic words/patterns
     TOXIC_WORDS = [
@@ -91,39 +430,100 @@ class ToxicityFilter:
         'damn', 'hell', 'crap', 'suck', 'terrible', 'horrible'
     ]
     
+    _lock = threading.Lock()
+    _source = None
+    _pattern = None
+    
+    @classmethod
+    def _lexicon_source(cls):
+        path = settings.TOXICITY_LEXICON_PATH
+        if path:
+            try:
+                return ('file', path, os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                pass
+        return ('builtin', tuple(cls.TOXIC_WORDS))
+    
+    @classmethod
+    def load_lexicon(cls, source):
+        if source[0] == 'file':
+            with open(source[1], encoding='utf-8') as f:
+                words = [line.split('#', 1)[0].strip() for line in f]
+            return [word for word in words if word]
+        return list(source[1])
+    
+    @classmethod
+    def get_pattern(cls):
+        """Return the compiled matcher, rebuilding it if the lexicon changed"""
+        source = cls._lexicon_source()
+        if source != cls._source:
+            with cls._lock:
+                if source != cls._source:
+                    words = sorted({w.lower() for w in cls.load_lexicon(source)}, key=len, reverse=True)
+                    alternation = '|'.join(re.escape(word) for word in words) or '(?!)'
+                    cls._pattern = re.compile(rf'\b(?:{alternation})\b', re.IGNORECASE)
+                    cls._source = source
+        return cls._pattern
+    
+    @classmethod
+    def reload(cls):
+        """Force the lexicon to be read and compiled again"""
+        with cls._lock:
+            cls._source = None
+        return cls.get_pattern()
+    
     @staticmethod
-    def is_toxic(text, threshold=2):
+    def _count_words(pattern, text, threshold):
+        found = set()
+        for match in pattern.finditer(text):
+            found.add(match.group().lower())
+            if len(found) >= threshold:
+                break
+        return len(found)
+    
+    @classmethod
+    def is_toxic(cls, text, threshold=None):
         """
         Check if text contains toxic content
         
         Args:
             text: Text to check
-            threshold: Number of toxic words to trigger filter
+            threshold: Number of distinct toxic words to trigger filter,
+                defaults to TOXICITY_THRESHOLD
         
         Returns:
             Boolean indicating if text is toxic
         """
-        text_lower = text.lower()
-        toxic_count = 0
-        
-        for word in ToxicityFilter.TOXIC_WORDS:
-            if word in text_lower:
-                toxic_count += 1
+        threshold = threshold or settings.TOXICITY_THRESHOLD
+        return cls._count_words(cls.get_pattern(), text, threshold) >= threshold
+    
+    @classmethod
+    def is_toxic_batch(cls, texts, threshold=None):
+        """
+        Check many texts at once, compiling the lexicon only once
         
-        return toxic_count >= threshold
+        Returns:
+            List of booleans in the same order as texts
+        """
+        threshold = threshold or settings.TOXICITY_THRESHOLD
+        pattern = cls.get_pattern()
+        return [cls._count_words(pattern, text, threshold) >= threshold for text in texts]
     
-    @staticmethod
-    def clean_text(text):
+    @classmethod
+    def clean_text(cls, text):
         """Remove or replace toxic words"""
-        text_lower = text.lower()
-        for word in ToxicityFilter.TOXIC_WORDS:
-            if word in text_lower:
-                text = re.sub(word, '***', text, flags=re.IGNORECASE)
-        return text
+        return cls.get_pattern().sub('***', text)
 
 
 class PriorityClassifier:
-    """Classify issue priority based on keywords"""
+    """
+    Classify issue priority
+    
+    Uses a scikit-learn model trained on historical urgency levels when one
+    has been saved to PRIORITY_MODEL_PATH (see the train_priority_model
+    command), and falls back to keyword matching otherwise. The model is
+    loaded once per process and reloaded when the file changes.
+    """
     
     HIGH_PRIORITY_KEYWORDS = [
         'emergency', 'urgent', 'dangerous', 'hazard', 'accident', 'injury',
@@ -134,23 +534,69 @@ class PriorityClassifier:
         'minor', 'small', 'cosmetic', 'aesthetic', 'non-urgent', 'eventually'
     ]
     
+    _lock = threading.Lock()
+    _keyword_source = None
+    _keyword_pattern = None
+    _model_source = None
+    _model = None
+    
     @staticmethod
-    def suggest_priority(title, description):
-        """
-        Suggest priority level based on text analysis
-        
-        Args:
-            title: Issue title
-            description: Issue description
-        
-        Returns:
-            Suggested priority ('high', 'medium', 'low')
-        """
-        text = (title + ' ' + description).lower()
-        
-        # Check for high priority keywords
-        high_count = sum(1 for keyword in PriorityClassifier.HIGH_PRIORITY_KEYWORDS if keyword in text)
-        low_count = sum(1 for keyword in PriorityClassifier.LOW_PRIORITY_KEYWORDS if keyword in text)
+    def issue_text(title, description):
+        return f"{title} {description}"
+    
+    @classmethod
+    def get_keyword_pattern(cls):
+        """Return one compiled alternation over all keywords"""
+        source = (tuple(cls.HIGH_PRIORITY_KEYWORDS), tuple(cls.LOW_PRIORITY_KEYWORDS))
+        if source != cls._keyword_source:
+            with cls._lock:
+                keywords = sorted(set(source[0]) | set(source[1]), key=len, reverse=True)
+                cls._keyword_pattern = re.compile('|'.join(re.escape(k) for k in keywords) or '(?!)')
+                cls._keyword_source = source
+        return cls._keyword_pattern
+    
+    @classmethod
+    def get_model(cls):
+        """Return the trained model, or None if no model has been saved"""
+        path = settings.PRIORITY_MODEL_PATH
+        try:
+            source = (str(path), os.stat(path).st_mtime_ns)
+        except (FileNotFoundError, TypeError):
+            return None
+        if source != cls._model_source:
+            with cls._lock:
+                if source != cls._model_source:
+                    import joblib
+                    cls._model = joblib.load(path)
+                    cls._model_source = source
+        return cls._model
+    
+    @classmethod
+    def save_model(cls, model, path=None):
+        """Persist a trained model atomically"""
+        import joblib
+        path = Path(path or settings.PRIORITY_MODEL_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.joblib')
+        with os.fdopen(fd, 'wb') as f:
+            joblib.dump(model, f)
+        os.replace(tmp_path, path)
+    
+    @staticmethod
+    def build_model():
+        """Untrained text classification pipeline"""
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+        return make_pipeline(
+            TfidfVectorizer(stop_words='english', ngram_range=(1, 2), sublinear_tf=True, min_df=1),
+            LogisticRegression(max_iter=1000, class_weight='balanced'),
+        )
+    
+    @classmethod
+    def _keyword_priority(cls, pattern, text):
+        found = set(pattern.findall(text.lower()))
+        high_count = len(found.intersection(cls.HIGH_PRIORITY_KEYWORDS))
+        low_count = len(found.intersection(cls.LOW_PRIORITY_KEYWORDS))
         
         if high_count >= 2:
             return 'high'
@@ -162,3 +608,37 @@ class PriorityClassifier:
             return 'low'
         else:
             return 'medium'
+    
+    @classmethod
+    def suggest_priorities(cls, texts):
+        """
+        Suggest priority levels for many issues at once
+        
+        Args:
+            texts: Iterable of issue texts (title + description)
+        
+        Returns:
+            List of suggested priorities ('high', 'medium', 'low')
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        model = cls.get_model()
+        if model is not None:
+            return [str(label) for label in model.predict(texts)]
+        pattern = cls.get_keyword_pattern()
+        return [cls._keyword_priority(pattern, text) for text in texts]
+    
+    @classmethod
+    def suggest_priority(cls, title, description):
+        """
+        Suggest priority level based on text analysis
+        
+        Args:
+            title: Issue title
+            description: Issue description
+        
+        Returns:
+            Suggested priority ('high', 'medium', 'low')
+        """
+        return cls.suggest_priorities([cls.issue_text(title, description)])[0]
@@ -3,6 +3,11 @@ from . import api_views
 
 urlpatterns = [
     path('issues/', api_views.issue_list_api, name='api_issue_list'),
+    path('issues/search/', api_views.issue_search_api, name='api_issue_search'),
+    path('issues/map/', api_views.issue_map_api, name='api_issue_map'),
+    path('map/tiles/<int:zoom>/<int:x>/<int:y>/', api_views.issue_map_tile_api, name='api_map_tile'),
     path('issues/<uuid:issue_id>/', api_views.issue_detail_api, name='api_issue_detail'),
+    path('sync/', api_views.sync_api, name='api_sync'),
     path('stats/', api_views.stats_api, name='api_stats'),
+    path('stats/timeseries/', api_views.stats_timeseries_api, name='api_stats_timeseries'),
 ]
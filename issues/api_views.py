@@ -1,13 +1,57 @@
-from django.http import JsonResponse
-from django.db.models import Count
-from .models import Issue
+import hashlib
+import json
+import math
+from datetime import date, datetime, time, timedelta
 
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.cache import cache
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Q, Sum, Window
+from django.db.models.functions import Ceil, RowNumber, Substr, TruncDay, TruncMonth, TruncWeek
+from django.utils.cache import patch_cache_control
+from django.utils import timezone
+from django.views.decorators.http import condition
+from .models import DailyIssueStat, Issue
+from . import caching, search, sync
+from .instrumentation import query_budget
+from .geo import cluster_precision, parse_bbox, tile_bbox
+from .stats import get_summary as get_issue_summary
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter, parse_datetime_value
 
-def issue_list_api(request):
-    """API endpoint for issue list"""
-    issues = Issue.objects.all()
-    
-    # Apply filters
+MAP_MARKER_LIMIT = 2000
+MAP_TILE_MARKER_LIMIT = 200
+MAP_TILE_MAX_ZOOM = 22
+MAP_TILE_CACHE_SECONDS = 60
+
+ISSUE_LIST_ORDERING = ('-created_at', '-id')
+ISSUE_LIST_DEFAULT_LIMIT = 100
+ISSUE_LIST_MAX_LIMIT = 1000
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+ISSUE_LIST_FIELDS = (
+    'id', 'issue_id', 'title', 'category', 'status', 'urgency_level', 'address',
+    'latitude', 'longitude', 'created_at', 'user__username',
+)
+
+
+def serialize_issue_row(row):
+    """Serialize an issue from a values() row of ISSUE_LIST_FIELDS"""
+    return {
+        'id': str(row['issue_id']),
+        'title': row['title'],
+        'category': row['category'],
+        'status': row['status'],
+        'urgency_level': row['urgency_level'],
+        'address': row['address'],
+        'latitude': float(row['latitude']) if row['latitude'] else None,
+        'longitude': float(row['longitude']) if row['longitude'] else None,
+        'created_at': row['created_at'].isoformat(),
+        'user': row['user__username'],
+    }
+
+
+def filter_issues(request, issues):
+    """Apply the ?category= and ?status= filters shared by the list endpoints"""
     category = request.GET.get('category')
     status = request.GET.get('status')
     
@@ -15,29 +59,156 @@ def issue_list_api(request):
         issues = issues.filter(category=category)
     if status:
         issues = issues.filter(status=status)
+    return issues
+
+
+def _once(request, name, compute):
+    """Compute a value once per request (condition() asks for the ETag and Last-Modified separately)"""
+    cache_attr = f'_conditional_{name}'
+    if not hasattr(request, cache_attr):
+        setattr(request, cache_attr, compute())
+    return getattr(request, cache_attr)
+
+
+def _make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _issue_set_state(request, issues):
+    """
+    Latest change and size of a set of issues, from one aggregate query
     
-    data = []
-    for issue in issues:
-        data.append({
-            'id': str(issue.issue_id),
-            'title': issue.title,
-            'category': issue.category,
-            'status': issue.status,
-            'urgency_level': issue.urgency_level,
-            'address': issue.address,
-            'latitude': float(issue.latitude) if issue.latitude else None,
-            'longitude': float(issue.longitude) if issue.longitude else None,
-            'created_at': issue.created_at.isoformat(),
-            'user': issue.user.username,
-        })
+    The count catches deletions, which do not move the latest updated_at.
+    """
+    return _once(request, 'issue_set', lambda: issues.aggregate(last_modified=Max('updated_at'), count=Count('pk')))
+
+
+def issue_list_etag(request):
+    state = _issue_set_state(request, filter_issues(request, Issue.objects.all()))
+    return _make_etag(request.get_full_path(), state['last_modified'], state['count'])
+
+
+def issue_list_last_modified(request):
+    return _issue_set_state(request, filter_issues(request, Issue.objects.all()))['last_modified']
+
+
+def stats_etag(request):
+    state = _issue_set_state(request, Issue.objects.all())
+    return _make_etag('stats', state['last_modified'], state['count'])
+
+
+def stats_last_modified(request):
+    return _issue_set_state(request, Issue.objects.all())['last_modified']
+
+
+def _issue_updated_at(request, issue_id):
+    return _once(
+        request, 'issue_updated_at',
+        lambda: Issue.objects.filter(issue_id=issue_id).values_list('updated_at', flat=True).first(),
+    )
+
+
+def issue_detail_etag(request, issue_id):
+    updated_at = _issue_updated_at(request, issue_id)
+    return _make_etag(issue_id, updated_at) if updated_at else None
+
+
+def issue_detail_last_modified(request, issue_id):
+    return _issue_updated_at(request, issue_id)
+
+
+@query_budget(2)
+@condition(etag_func=issue_list_etag, last_modified_func=issue_list_last_modified)
+def issue_list_api(request):
+    """
+    API endpoint for issue list
     
-    return JsonResponse({'issues': data})
+    Results are paginated with an opaque `cursor` token on (created_at, id);
+    pass the returned `next` value to fetch the following page. With
+    `format=ndjson` every matching issue is streamed as one JSON object
+    per line instead.
+    """
+    issues = filter_issues(request, Issue.objects.all())
+    rows = issues.order_by(*ISSUE_LIST_ORDERING).values(*ISSUE_LIST_FIELDS)
+    
+    if request.GET.get('format') == 'ndjson':
+        lines = (
+            json.dumps(serialize_issue_row(row)) + '\n'
+            for row in rows.iterator(chunk_size=2000)
+        )
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+    
+    try:
+        limit = min(max(int(request.GET.get('limit', ISSUE_LIST_DEFAULT_LIMIT)), 1), ISSUE_LIST_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            created_at, pk = decode_cursor(cursor, 2)
+            if not isinstance(pk, int):
+                raise InvalidCursor('Malformed cursor')
+            rows = rows.filter(keyset_filter(ISSUE_LIST_ORDERING, [parse_datetime_value(created_at), pk]))
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    page = list(rows[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1]['created_at'], page[-1]['id'])
+    
+    return JsonResponse({
+        'issues': [serialize_issue_row(row) for row in page],
+        'next': next_cursor,
+    })
 
 
+@query_budget(2)
+def issue_search_api(request):
+    """
+    API endpoint for full-text search over issues and their comments
+    
+    Results are ranked best match first and paginated with the returned
+    `next` cursor. `category` and `status` narrow the candidates.
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'q is required'}, status=400)
+    
+    issues = filter_issues(request, Issue.objects.all())
+    
+    try:
+        limit = min(max(int(request.GET.get('limit', SEARCH_DEFAULT_LIMIT)), 1), SEARCH_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    
+    after = None
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            after = search.decode_position(cursor)
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    hits = search.search(issues, query, limit + 1, after)
+    next_cursor = search.encode_position(hits[limit - 1]) if len(hits) > limit else None
+    hits = hits[:limit]
+    rows = {row['id']: row for row in Issue.objects.filter(pk__in=[pk for pk, _ in hits]).values(*ISSUE_LIST_FIELDS)}
+    
+    return JsonResponse({
+        'issues': [dict(serialize_issue_row(rows[pk]), score=score) for pk, score in hits if pk in rows],
+        'next': next_cursor,
+    })
+
+
+@query_budget(2)
+@condition(etag_func=issue_detail_etag, last_modified_func=issue_detail_last_modified)
 def issue_detail_api(request, issue_id):
     """API endpoint for issue detail"""
     try:
-        issue = Issue.objects.get(issue_id=issue_id)
+        issue = Issue.objects.select_related('user', 'assigned_to').get(issue_id=issue_id)
         data = {
             'id': str(issue.issue_id),
             'title': issue.title,
@@ -58,16 +229,302 @@ def issue_detail_api(request, issue_id):
         return JsonResponse({'error': 'Issue not found'}, status=404)
 
 
+@query_budget(9)
+def sync_api(request):
+    """
+    API endpoint for field workers to sync their assigned issues offline
+    
+    Without `since` the full state of the worker's issues, updates and
+    comments is returned, `limit` rows per page. Pass the returned `next`
+    token as `since` to get the next page, and then only what changed
+    afterwards; deleted or no longer visible rows come
+    back as tombstones (`"action": "delete"`). Keep requesting while
+    `has_more` is true. A 410 response means the token is older than the
+    retained change log and the client must start over without `since`.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    
+    try:
+        limit = min(max(int(request.GET.get('limit', sync.SYNC_DEFAULT_LIMIT)), 1), sync.SYNC_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    
+    since = request.GET.get('since')
+    try:
+        # A snapshot in progress is (position, model, pk); a delta token is (position,)
+        cursor = _decode_sync_token(since) if since else None
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid since token'}, status=400)
+    if cursor is None or len(cursor) == 3:
+        changes, cursor, has_more = sync.snapshot(request.user.pk, cursor, limit)
+    else:
+        try:
+            changes, position, has_more = sync.changes_since(request.user.pk, cursor[0], limit)
+        except sync.ResyncRequired:
+            return JsonResponse({'error': 'since token expired, sync again without it'}, status=410)
+        cursor = (position,)
+    
+    return JsonResponse({
+        'changes': changes,
+        'next': encode_cursor(*cursor),
+        'has_more': has_more,
+    })
+
+
+def _decode_sync_token(token):
+    """Decode a sync token into (position,) or (position, model, pk)"""
+    try:
+        values = decode_cursor(token, 1)
+    except InvalidCursor:
+        values = decode_cursor(token, 3)
+        if values[1] not in sync.SNAPSHOT_MODELS or not isinstance(values[2], int):
+            raise InvalidCursor('Malformed cursor')
+    if not isinstance(values[0], int):
+        raise InvalidCursor('Malformed cursor')
+    return tuple(values)
+
+
+def _map_marker(row, category_labels):
+    return {
+        'id': str(row['issue_id']),
+        'title': row['title'],
+        'category': category_labels.get(row['category'], row['category']),
+        'status': row['status'],
+        'urgency': row['urgency_level'],
+        'lat': float(row['latitude']),
+        'lng': float(row['longitude']),
+        'address': row['address'],
+    }
+
+
+@query_budget(1)
+def issue_map_api(request):
+    """API endpoint for map markers inside the visible viewport"""
+    bbox = parse_bbox(request.GET.get('bbox'))
+    if bbox is None:
+        return JsonResponse({'error': 'bbox must be south,west,north,east with west <= east'}, status=400)
+    
+    issues = Issue.objects.in_bbox(*bbox)
+    category = request.GET.get('category')
+    status = request.GET.get('status')
+    if category:
+        issues = issues.filter(category=category)
+    if status:
+        issues = issues.filter(status=status)
+    
+    rows = issues.values(
+        'issue_id', 'title', 'category', 'status', 'urgency_level',
+        'latitude', 'longitude', 'address',
+    )[:MAP_MARKER_LIMIT + 1]
+    category_labels = dict(Issue.CATEGORY_CHOICES)
+    data = [_map_marker(row, category_labels) for row in rows]
+    
+    return JsonResponse({
+        'issues': data[:MAP_MARKER_LIMIT],
+        'truncated': len(data) > MAP_MARKER_LIMIT,
+    })
+
+
+@query_budget(2)
+def issue_map_tile_api(request, zoom, x, y):
+    """
+    API endpoint for one map tile
+    
+    Returns individual markers when the tile holds at most
+    MAP_TILE_MARKER_LIMIT issues, otherwise clusters aggregated by geohash
+    cell with a count per status. Responses are cached per tile and filter,
+    under the versions of the filter's cache scopes so that issue changes
+    invalidate them.
+    """
+    if zoom > MAP_TILE_MAX_ZOOM or not (0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom):
+        return JsonResponse({'error': 'Tile out of range'}, status=400)
+    
+    category = request.GET.get('category', '')
+    status = request.GET.get('status', '')
+    version = caching.version_key(caching.filtered_issues(request))
+    cache_key = f'map-tile:{zoom}:{x}:{y}:{category}:{status}:{version}'
+    data = cache.get(cache_key)
+    
+    if data is None:
+        issues = Issue.objects.in_bbox(*tile_bbox(zoom, x, y)).order_by()
+        if category:
+            issues = issues.filter(category=category)
+        if status:
+            issues = issues.filter(status=status)
+        
+        count = issues.count()
+        if count <= MAP_TILE_MARKER_LIMIT:
+            category_labels = dict(Issue.CATEGORY_CHOICES)
+            rows = issues.values(
+                'issue_id', 'title', 'category', 'status', 'urgency_level',
+                'latitude', 'longitude', 'address',
+            )
+            data = {'count': count, 'markers': [_map_marker(row, category_labels) for row in rows], 'clusters': []}
+        else:
+            status_counts = {
+                key: Count('id', filter=Q(status=key)) for key, _ in Issue.STATUS_CHOICES
+            }
+            clusters = (
+                issues.annotate(cell=Substr('geohash', 1, cluster_precision(zoom)))
+                .values('cell')
+                .annotate(count=Count('id'), lat=Avg('latitude'), lng=Avg('longitude'), **status_counts)
+            )
+            data = {
+                'count': count,
+                'markers': [],
+                'clusters': [
+                    {
+                        'lat': float(cluster['lat']),
+                        'lng': float(cluster['lng']),
+                        'count': cluster['count'],
+                        'by_status': {key: cluster[key] for key in status_counts if cluster[key]},
+                    }
+                    for cluster in clusters
+                ],
+            }
+        cache.set(cache_key, data, MAP_TILE_CACHE_SECONDS)
+    
+    response = JsonResponse(data)
+    patch_cache_control(response, public=True, max_age=MAP_TILE_CACHE_SECONDS)
+    return response
+
+
+@query_budget(4)
+@caching.cached_view(caching.all_issues)
+@condition(etag_func=stats_etag, last_modified_func=stats_last_modified)
 def stats_api(request):
     """API endpoint for statistics"""
-    total_issues = Issue.objects.count()
-    issues_by_status = Issue.objects.values('status').annotate(count=Count('id'))
-    issues_by_category = Issue.objects.values('category').annotate(count=Count('id'))
+    summary = get_issue_summary()
     
     data = {
-        'total_issues': total_issues,
-        'by_status': list(issues_by_status),
-        'by_category': list(issues_by_category),
+        'total_issues': summary['total'],
+        'by_status': [
+            {'status': status, 'count': count}
+            for status, count in summary['by_status'].items()
+        ],
+        'by_category': [
+            {'category': category, 'count': count}
+            for category, count in summary['by_category'].items()
+        ],
     }
     
     return JsonResponse(data)
+
+
+TIMESERIES_INTERVALS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+TIMESERIES_DEFAULT_DAYS = 90
+# Longest range accepted; the percentiles rank every issue resolved in it
+TIMESERIES_MAX_DAYS = 731
+RESOLUTION_PERCENTILES = (0.5, 0.9)
+
+
+def _parse_date(value, default):
+    if not value:
+        return default
+    return date.fromisoformat(value)
+
+
+@query_budget(2)
+def stats_timeseries_api(request):
+    """
+    API endpoint for issue trends
+    
+    Returns issues opened and resolved per day, week or month and category,
+    with nearest-rank resolution time percentiles. Counts are summed from
+    the DailyIssueStat rollup; percentiles are ranked in the database over
+    the issues resolved in the range, which is limited to
+    TIMESERIES_MAX_DAYS days to bound that query.
+    
+    Query parameters:
+        interval: day (default), week or month
+        start, end: Inclusive ISO dates; defaults to the last 90 days
+        category: Restrict to one or more categories
+    """
+    trunc = TIMESERIES_INTERVALS.get(request.GET.get('interval', 'day'))
+    if trunc is None:
+        return JsonResponse({'error': 'interval must be day, week or month'}, status=400)
+    
+    try:
+        end = _parse_date(request.GET.get('end'), timezone.localdate())
+        start = _parse_date(request.GET.get('start'), end - timedelta(days=TIMESERIES_DEFAULT_DAYS))
+    except ValueError:
+        return JsonResponse({'error': 'start and end must be YYYY-MM-DD dates'}, status=400)
+    if start > end:
+        return JsonResponse({'error': 'start must not be after end'}, status=400)
+    if (end - start).days >= TIMESERIES_MAX_DAYS:
+        return JsonResponse({'error': f'the range must not exceed {TIMESERIES_MAX_DAYS} days'}, status=400)
+    
+    tz = timezone.get_current_timezone()
+    since = datetime.combine(start, time.min, tzinfo=tz)
+    until = datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz)
+    
+    issues = Issue.objects.order_by()
+    daily = DailyIssueStat.objects.filter(date__gte=start, date__lte=end).order_by()
+    categories = request.GET.getlist('category')
+    if categories:
+        issues = issues.filter(category__in=categories)
+        daily = daily.filter(category__in=categories)
+    
+    series = {}
+    
+    def bucket_row(bucket, category):
+        if isinstance(bucket, datetime):
+            bucket = timezone.localtime(bucket, tz).date()
+        key = (bucket, category)
+        if key not in series:
+            series[key] = {'opened': 0, 'resolved': 0}
+            for percentile in RESOLUTION_PERCENTILES:
+                series[key][f'resolution_days_p{int(percentile * 100)}'] = None
+        return series[key]
+    
+    # Opened and resolved per bucket, re-bucketed from the daily rollup
+    counts = (
+        daily.annotate(bucket=trunc('date'))
+        .values('bucket', 'category')
+        .annotate(opened=Sum('opened'), resolved=Sum('resolved'))
+    )
+    for row in counts:
+        if row['opened'] or row['resolved']:
+            entry = bucket_row(row['bucket'], row['category'])
+            entry['opened'], entry['resolved'] = row['opened'], row['resolved']
+    
+    # Resolved per bucket, keeping only the rows at each percentile rank
+    partition = [trunc('resolved_at', tzinfo=tz), F('category')]
+    resolved = (
+        issues.filter(status='resolved', resolved_at__gte=since, resolved_at__lt=until)
+        .annotate(
+            bucket=trunc('resolved_at', tzinfo=tz),
+            duration=ExpressionWrapper(F('resolved_at') - F('created_at'), output_field=DurationField()),
+        )
+        .annotate(
+            rank=Window(RowNumber(), partition_by=partition, order_by=F('duration').asc()),
+            resolved_count=Window(Count('id'), partition_by=partition),
+        )
+    )
+    at_percentile = Q()
+    for percentile in RESOLUTION_PERCENTILES:
+        at_percentile |= Q(rank=Ceil(F('resolved_count') * percentile))
+    
+    for row in resolved.filter(at_percentile).values('bucket', 'category', 'duration', 'rank', 'resolved_count'):
+        entry = bucket_row(row['bucket'], row['category'])
+        for percentile in RESOLUTION_PERCENTILES:
+            if row['rank'] == math.ceil(row['resolved_count'] * percentile):
+                entry[f'resolution_days_p{int(percentile * 100)}'] = round(
+                    row['duration'].total_seconds() / 86400, 2
+                )
+    
+    data = {
+        'interval': request.GET.get('interval', 'day'),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'series': [
+            {'bucket': bucket.isoformat(), 'category': category, **values}
+            for (bucket, category), values in sorted(series.items())
+        ],
+    }
+    return JsonResponse(data)
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class IssuesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'issues'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+        from . import backfill, database, postgres, search, signals  # noqa: F401
+        connection_created.connect(database.configure_connection)
+        post_migrate.connect(search.create_index, sender=self)
+        post_migrate.connect(postgres.create_indexes, sender=self)
+        post_migrate.connect(backfill.backfill, sender=self)
@@ -0,0 +1,77 @@
+"""
+Backfill of issue columns derived from other fields
+Issue.save() and the bulk import fill the derived columns, but rows that
+existed before a column was added (or were changed with QuerySet.update()
+or raw SQL) still hold its default. The post_migrate handler fills them in
+after every migrate and the backfill_issue_fields command does it on demand.
+"""
+from django.db import connections
+
+from . import caching, geo
+from .models import Issue
+
+BACKFILL_CHUNK_SIZE = 2000
+
+
+def _has_columns(connection, *columns):
+    """Whether the issue table exists with these columns (it may be migrated backwards)"""
+    table = Issue._meta.db_table
+    with connection.cursor() as cursor:
+        if table not in connection.introspection.table_names(cursor):
+            return False
+        existing = {column.name for column in connection.introspection.get_table_description(cursor, table)}
+    return existing.issuperset(columns)
+
+
+def fill_geohashes(using='default', chunk_size=BACKFILL_CHUNK_SIZE):
+    """Compute the geohash of located issues that have none; returns the number filled"""
+    missing = (
+        Issue.objects.using(using)
+        .filter(geohash='', latitude__isnull=False, longitude__isnull=False)
+        .order_by('pk')
+    )
+    filled, last_pk = 0, 0
+    while True:
+        rows = list(missing.filter(pk__gt=last_pk).values_list('pk', 'latitude', 'longitude')[:chunk_size])
+        if not rows:
+            return filled
+        # bulk_update skips save(), so updated_at and the signal handlers are untouched
+        Issue.objects.using(using).bulk_update(
+            [Issue(pk=pk, geohash=geo.encode_geohash(latitude, longitude)) for pk, latitude, longitude in rows],
+            ['geohash'],
+        )
+        filled += len(rows)
+        last_pk = rows[-1][0]
+
+
+def fill_urgency_ranks(using='default'):
+    """Set the urgency rank of issues whose rank does not match their urgency level; returns the number fixed"""
+    issues = Issue.objects.using(using)
+    fixed = 0
+    for level, rank in Issue.URGENCY_RANKS.items():
+        fixed += issues.filter(urgency_level=level).exclude(urgency_rank=rank).update(urgency_rank=rank)
+    # Unknown levels rank as medium, as in Issue.fill_derived_fields()
+    medium = Issue.URGENCY_RANKS['medium']
+    fixed += (
+        issues.exclude(urgency_level__in=list(Issue.URGENCY_RANKS)).exclude(urgency_rank=medium)
+        .update(urgency_rank=medium)
+    )
+    return fixed
+
+
+def backfill(using='default', chunk_size=BACKFILL_CHUNK_SIZE, **kwargs):
+    """Fill derived columns left at their defaults (connected to post_migrate); returns counts per column"""
+    if not _has_columns(connections[using], 'geohash', 'urgency_rank'):
+        return {}
+    counts = {
+        'geohash': fill_geohashes(using, chunk_size),
+        'urgency_rank': fill_urgency_ranks(using),
+    }
+    if any(counts.values()):
+        # The updates skip the signal handlers, so drop every cached page
+        scopes = caching.issue_scopes()
+        for category, _ in Issue.CATEGORY_CHOICES:
+            for status, _ in Issue.STATUS_CHOICES:
+                scopes |= caching.issue_scopes(category, status)
+        caching.invalidate(scopes)
+    return counts
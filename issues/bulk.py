@@ -0,0 +1,464 @@
+"""
+Bulk import and export of issues
+Rows are streamed from and to CSV, NDJSON or Parquet files in fixed-size
+batches, so memory does not depend on the size of the file. Imported issues
+are written with bulk_create, which bypasses Issue.save() and the signal
+handlers, so import_issues() does their work (derived columns, statistics,
+search index, sync log, page cache and similarity index) once per batch.
+"""
+from contextlib import nullcontext
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+import csv
+import itertools
+import json
+import sys
+import uuid
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from accounts.models import User
+from . import ai, caching, geo, search, stats, sync
+from .models import Issue
+
+FORMATS = ('csv', 'ndjson', 'parquet')
+FORMAT_EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.parquet': 'parquet'}
+
+# Columns of the exchange format; user and assigned_to are usernames
+FIELDS = (
+    'issue_id', 'title', 'category', 'description', 'address', 'latitude', 'longitude',
+    'status', 'urgency_level', 'user', 'assigned_to', 'created_at', 'updated_at', 'resolved_at',
+    'suggested_priority', 'photo_before',
+)
+DATETIME_FIELDS = ('created_at', 'updated_at', 'resolved_at')
+COORDINATE_FIELDS = ('latitude', 'longitude')
+
+EXPORT_VALUES = {
+    field: {'user': 'user__username', 'assigned_to': 'assigned_to__username'}.get(field, field)
+    for field in FIELDS
+}
+
+DEFAULT_BATCH_SIZE = 2000
+COORDINATE_STEP = Decimal('0.000001')
+
+# Duplicate candidates kept per imported issue, as in the background pipeline
+DUPLICATE_THRESHOLD = 0.6
+DUPLICATE_TOP_K = 5
+# Text matches checked against the distance limit before keeping the top ones
+DUPLICATE_SEARCH_K = 50
+
+
+class InvalidRow(ValueError):
+    """A row that cannot be imported"""
+    
+    def __init__(self, number, message):
+        super().__init__(f'Row {number}: {message}')
+        self.number = number
+        self.message = message
+
+
+def detect_format(path, format=None):
+    """The explicit format, or the one implied by the file extension"""
+    if format:
+        return format
+    try:
+        return FORMAT_EXTENSIONS[Path(path).suffix.lower()]
+    except KeyError:
+        raise ValueError(f'Cannot tell the format of {path}; choose one of {", ".join(FORMATS)}') from None
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError('Parquet files need pyarrow (pip install pyarrow)') from None
+    return pyarrow, pyarrow.parquet
+
+
+def _parquet_schema(pyarrow):
+    def column_type(field):
+        if field in DATETIME_FIELDS:
+            return pyarrow.timestamp('us', tz='UTC')
+        if field in COORDINATE_FIELDS:
+            return pyarrow.float64()
+        return pyarrow.string()
+    return pyarrow.schema([(field, column_type(field)) for field in FIELDS])
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def read_rows(path, format, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield the rows of a file as dicts, one at a time
+    
+    Args:
+        path: File to read, or '-' for standard input (CSV and NDJSON)
+        format: One of FORMATS
+        batch_size: Rows decoded at a time from Parquet files
+    """
+    if format == 'parquet':
+        _, parquet = _pyarrow()
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield from batch.to_pylist()
+        return
+    
+    source = nullcontext(sys.stdin) if path == '-' else open(path, newline='', encoding='utf-8')
+    with source as f:
+        if format == 'csv':
+            yield from csv.DictReader(f)
+            return
+        number = 0
+        for line in f:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                raise InvalidRow(number, f'invalid JSON ({exc})') from None
+            if not isinstance(row, dict):
+                raise InvalidRow(number, 'expected a JSON object')
+            yield row
+
+
+def export_rows(queryset, chunk_size=DEFAULT_BATCH_SIZE):
+    """Yield the issues of a queryset as export rows, walking the primary key"""
+    last_pk = 0
+    while True:
+        rows = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk')
+            .values('pk', *EXPORT_VALUES.values())[:chunk_size]
+        )
+        if not rows:
+            return
+        for row in rows:
+            values = {field: row[column] for field, column in EXPORT_VALUES.items()}
+            values['issue_id'] = str(values['issue_id'])
+            for field in COORDINATE_FIELDS:
+                if values[field] is not None:
+                    values[field] = float(values[field])
+            yield values
+        last_pk = rows[-1]['pk']
+
+
+def _isoformat(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def write_rows(rows, out, format, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Write export rows to a file object (CSV or NDJSON) or path (Parquet)
+    
+    Returns:
+        Number of rows written
+    """
+    count = 0
+    if format == 'parquet':
+        pyarrow, parquet = _pyarrow()
+        if not isinstance(out, (str, Path)):
+            raise ValueError('Parquet can only be written to a file')
+        schema = _parquet_schema(pyarrow)
+        with parquet.ParquetWriter(out, schema) as writer:
+            for batch in _batches(rows, batch_size):
+                writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+    elif format == 'csv':
+        writer = csv.DictWriter(out, FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({
+                field: '' if value is None else value.isoformat() if isinstance(value, datetime) else value
+                for field, value in row.items()
+            })
+            count += 1
+    else:
+        for row in rows:
+            out.write(json.dumps(row, default=_isoformat) + '\n')
+            count += 1
+    return count
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _choice(row, field, choices, default):
+    value = _text(row.get(field)) or default
+    if value not in {key for key, _ in choices}:
+        raise ValueError(f'{field} {value!r} is not one of {", ".join(key for key, _ in choices)}')
+    return value
+
+
+def _datetime(row, field):
+    value = row.get(field)
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = _text(value)
+        try:
+            parsed = parse_datetime(text)
+            if parsed is None and (day := parse_date(text)) is not None:
+                parsed = datetime.combine(day, time())
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValueError(f'{field} {text!r} is not an ISO 8601 date')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _coordinate(row, field, limit):
+    value = row.get(field)
+    if value is None or value == '':
+        return None
+    try:
+        number = Decimal(_text(value)).quantize(COORDINATE_STEP)
+    except InvalidOperation:
+        raise ValueError(f'{field} {value!r} is not a number') from None
+    if not -limit <= number <= limit:
+        raise ValueError(f'{field} {value} is out of range')
+    return number
+
+
+def build_issue(row, users, default_user_id, now):
+    """
+    Turn an import row into an unsaved Issue
+    
+    Args:
+        row: Dict keyed by FIELDS
+        users: Primary keys of the known users by username
+        default_user_id: Reporter for rows without a known user, or None
+        now: Time used for missing timestamps
+    
+    Raises:
+        ValueError: if the row is invalid
+    """
+    title = _text(row.get('title'))
+    if not title:
+        raise ValueError('title is required')
+    if len(title) > Issue._meta.get_field('title').max_length:
+        raise ValueError('title is too long')
+    
+    issue_id = _text(row.get('issue_id'))
+    try:
+        issue_id = uuid.UUID(issue_id) if issue_id else uuid.uuid4()
+    except ValueError:
+        raise ValueError(f'issue_id {issue_id!r} is not a UUID') from None
+    
+    username = _text(row.get('user'))
+    user_id = users.get(username, default_user_id)
+    if user_id is None:
+        raise ValueError(f'unknown user {username!r}' if username else 'user is required')
+    assignee = _text(row.get('assigned_to'))
+    if assignee and assignee not in users:
+        raise ValueError(f'unknown assignee {assignee!r}')
+    
+    latitude = _coordinate(row, 'latitude', 90)
+    longitude = _coordinate(row, 'longitude', 180)
+    if (latitude is None) != (longitude is None):
+        raise ValueError('latitude and longitude must be given together')
+    
+    created_at = _datetime(row, 'created_at') or now
+    suggested_priority = _text(row.get('suggested_priority'))
+    if suggested_priority:
+        suggested_priority = _choice(row, 'suggested_priority', Issue.URGENCY_CHOICES, None)
+    
+    issue = Issue(
+        issue_id=issue_id,
+        user_id=user_id,
+        assigned_to_id=users[assignee] if assignee else None,
+        title=title,
+        category=_choice(row, 'category', Issue.CATEGORY_CHOICES, None),
+        description=_text(row.get('description')),
+        address=_text(row.get('address')),
+        latitude=latitude,
+        longitude=longitude,
+        photo_before=_text(row.get('photo_before')),
+        status=_choice(row, 'status', Issue.STATUS_CHOICES, 'pending'),
+        urgency_level=_choice(row, 'urgency_level', Issue.URGENCY_CHOICES, 'medium'),
+        suggested_priority=suggested_priority,
+        created_at=created_at,
+        updated_at=_datetime(row, 'updated_at') or now,
+        resolved_at=_datetime(row, 'resolved_at'),
+    )
+    issue.fill_derived_fields()
+    return issue
+
+
+def _build_batch(batch, default_user_id, on_invalid, result):
+    """Valid, not yet imported Issues of a batch of (number, row) pairs"""
+    usernames = {_text(row.get(field)) for _, row in batch for field in ('user', 'assigned_to')} - {''}
+    users = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+    now = timezone.now()
+    
+    issues = []
+    for number, row in batch:
+        try:
+            issues.append(build_issue(row, users, default_user_id, now))
+        except ValueError as exc:
+            if on_invalid is None:
+                raise InvalidRow(number, str(exc)) from None
+            on_invalid(number, str(exc))
+            result['invalid'] += 1
+    
+    # Rows already imported (or repeated in the file) are skipped, so a
+    # failed import can simply be run again
+    existing = set(
+        Issue.objects.filter(issue_id__in=[issue.issue_id for issue in issues])
+        .values_list('issue_id', flat=True)
+    )
+    new_issues = []
+    for issue in issues:
+        if issue.issue_id in existing:
+            result['existing'] += 1
+        else:
+            existing.add(issue.issue_id)
+            new_issues.append(issue)
+    return new_issues
+
+
+def bulk_create_keeping_timestamps(model, objs, field_names=('created_at', 'updated_at')):
+    """
+    bulk_create objs and keep the created_at/updated_at values they carry
+    
+    auto_now_add/auto_now set the current time on insert, so the given
+    values are written back with bulk_update afterwards; call it inside a
+    transaction. Timestamps left as None keep the insert time.
+    """
+    given = [[getattr(obj, name) for name in field_names] for obj in objs]
+    model.objects.bulk_create(objs)
+    restored = []
+    for obj, values in zip(objs, given):
+        for name, value in zip(field_names, values):
+            if value is not None:
+                setattr(obj, name, value)
+        if any(value is not None for value in values):
+            restored.append(obj)
+    if restored:
+        model.objects.bulk_update(restored, field_names)
+
+
+def _write_batch(issues):
+    """Insert a batch and do the work of the Issue signal handlers"""
+    with transaction.atomic():
+        bulk_create_keeping_timestamps(Issue, issues)
+        
+        stats.apply_created(stats.snapshot(issue) for issue in issues)
+        search.index_issues([issue.pk for issue in issues])
+        sync.record_created_issues(issues)
+        scopes = set()
+        for issue in issues:
+            scopes |= caching.issue_scopes(issue.category, issue.status)
+        caching.invalidate(scopes)
+
+
+def _find_duplicates(issues, indexes):
+    """Fill duplicate_candidates of new open issues from the similarity indexes"""
+    matches = {}
+    for category, index in indexes.items():
+        open_issues = [issue for issue in issues if issue.category == category and issue.is_open]
+        results = index.query_many(
+            [issue.similarity_text for issue in open_issues],
+            top_k=DUPLICATE_SEARCH_K, threshold=DUPLICATE_THRESHOLD,
+            exclude_ids=[issue.pk for issue in open_issues],
+        )
+        matches.update(zip(open_issues, results))
+    
+    candidate_pks = {pk for found in matches.values() for pk, _ in found}
+    candidates = {}
+    for pks in _batches(candidate_pks, DEFAULT_BATCH_SIZE):
+        # The index may lag behind the database, so confirm each match
+        for pk, issue_id, latitude, longitude in Issue.objects.filter(
+            pk__in=pks, status__in=Issue.OPEN_STATUSES,
+        ).values_list('pk', 'issue_id', 'latitude', 'longitude'):
+            candidates[pk] = (str(issue_id), latitude, longitude)
+    
+    for issue, found in matches.items():
+        found = [(pk, similarity) for pk, similarity in found if pk in candidates]
+        distances = [None] * len(found)
+        if issue.latitude is not None and found:
+            # Located issues are only matched with located issues nearby
+            found = [(pk, similarity) for pk, similarity in found if candidates[pk][1] is not None]
+            distances = geo.haversine_km(
+                float(issue.latitude), float(issue.longitude),
+                [float(candidates[pk][1]) for pk, _ in found],
+                [float(candidates[pk][2]) for pk, _ in found],
+            ).tolist() if found else []
+        issue.duplicate_candidates = [
+            {
+                'issue_id': candidates[pk][0],
+                'similarity': round(similarity, 4),
+                'distance_km': round(distance, 3) if distance is not None else None,
+            }
+            for (pk, similarity), distance in zip(found, distances)
+            if distance is None or distance <= ai.DuplicateDetector.MAX_DISTANCE_KM
+        ][:DUPLICATE_TOP_K]
+
+
+def import_issues(rows, default_user=None, batch_size=DEFAULT_BATCH_SIZE, analyze=False, on_invalid=None):
+    """
+    Create issues from import rows in batches
+    
+    Each batch is written in one transaction. Rows whose issue_id already
+    exists are skipped, so an interrupted import can be run again.
+    
+    Args:
+        rows: Iterable of dicts keyed by FIELDS (other keys are ignored)
+        default_user: Reporter for rows without a user or with an unknown one
+        batch_size: Rows per transaction
+        analyze: Suggest priorities and find duplicate candidates, as the
+            background pipeline does for issues reported on the site
+        on_invalid: Called with (row number, message) for each invalid row,
+            which is then skipped; without it InvalidRow is raised
+    
+    Returns:
+        Dict with the number of issues created and of rows skipped because
+        they already exist or are invalid
+    """
+    result = {'created': 0, 'existing': 0, 'invalid': 0}
+    default_user_id = default_user.pk if default_user else None
+    touched_indexes = {}
+    try:
+        for batch in _batches(enumerate(rows, 1), batch_size):
+            issues = _build_batch(batch, default_user_id, on_invalid, result)
+            if not issues:
+                continue
+            if analyze:
+                priorities = ai.PriorityClassifier.suggest_priorities(
+                    ai.PriorityClassifier.issue_text(issue.title, issue.description) for issue in issues
+                )
+                for issue, priority in zip(issues, priorities):
+                    issue.suggested_priority = issue.suggested_priority or priority
+                    issue.ai_processed_at = timezone.now()
+            
+            _write_batch(issues)
+            result['created'] += len(issues)
+            
+            indexes = {}
+            for category in {issue.category for issue in issues}:
+                indexes[category] = touched_indexes.setdefault(category, ai.get_similarity_index(category))
+                indexes[category].add_many(
+                    ((issue.pk, issue.similarity_text) for issue in issues
+                     if issue.category == category and issue.is_open),
+                    save=False,
+                )
+            if analyze:
+                _find_duplicates(issues, indexes)
+                Issue.objects.bulk_update(issues, ['duplicate_candidates'])
+    finally:
+        for index in touched_indexes.values():
+            index.save()
+    return result
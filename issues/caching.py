@@ -0,0 +1,214 @@
+"""
+Response caching for anonymous, read-heavy views
+Cache keys embed version counters for the data a page depends on ("all",
+"category:<name>", "status:<name>"); signal handlers bump the versions of
+whatever an issue, update or comment change touches, so unrelated pages
+stay cached.
+
+The counters are stored in the cache too, so invalidation is only precise
+when every process shares one cache backend: the default FileBasedCache
+under data/ for the workers of one host, Redis or Memcached across hosts.
+With a per-process LocMemCache the other processes would serve their copy
+until it expires after VIEW_CACHE_SECONDS.
+"""
+from functools import wraps
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .forms import IssueFilterForm
+
+VERSION_KEY = 'view-cache-version:{}'
+STATS_KEY = 'view-cache-stats:{}:{}'
+PAGE_KEY = 'view-cache:{}:{}:{}'
+
+# Names of the views wrapped by cached_view, for get_stats()
+CACHED_VIEWS = []
+
+
+def issue_scopes(category=None, status=None):
+    """Version scopes affected by a change to an issue in category/status"""
+    scopes = {'all'}
+    if category:
+        scopes.add(f'category:{category}')
+    if status:
+        scopes.add(f'status:{status}')
+    return scopes
+
+
+def _new_version():
+    # Start from the clock so an evicted counter never reuses an old value
+    return int(time.time() * 1000)
+
+
+def get_versions(scopes):
+    """Current version of each scope"""
+    keys = {scope: VERSION_KEY.format(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for scope, key in keys.items():
+        if key not in found:
+            cache.add(key, _new_version(), None)
+            found[key] = cache.get(key)
+        versions[scope] = found[key]
+    return versions
+
+
+def version_key(scopes):
+    """Digest of the current versions of the scopes, to embed in cache keys"""
+    versions = get_versions(scopes)
+    version = '.'.join(f'{scope}={versions[scope]}' for scope in sorted(versions))
+    return hashlib.sha1(version.encode()).hexdigest()
+
+
+def bump(scopes):
+    """Invalidate every cached page that depends on one of the scopes"""
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def invalidate(scopes):
+    """
+    Bump the scopes now and again once the transaction commits
+    
+    The second bump drops pages cached by concurrent requests that read
+    the database before the change became visible.
+    """
+    scopes = set(scopes)
+    bump(scopes)
+    transaction.on_commit(lambda: bump(scopes))
+
+
+def _count(view_name, outcome):
+    key = STATS_KEY.format(view_name, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_stats():
+    """Hit and miss counters per cached view"""
+    keys = {
+        (name, outcome): STATS_KEY.format(name, outcome)
+        for name in CACHED_VIEWS for outcome in ('hit', 'miss')
+    }
+    found = cache.get_many(keys.values())
+    stats = []
+    for name in CACHED_VIEWS:
+        hits = found.get(keys[name, 'hit'], 0)
+        misses = found.get(keys[name, 'miss'], 0)
+        total = hits + misses
+        stats.append({
+            'view': name,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / total if total else None,
+        })
+    return stats
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # Pending flash messages are rendered into the page
+    if CookieStorage.cookie_name in request.COOKIES:
+        return False
+    return not request.user.is_authenticated
+
+
+def _is_cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        # The page rendered a CSRF token, which must not be shared
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def cached_view(scopes):
+    """
+    Cache a view's responses for anonymous GET requests
+    
+    Args:
+        scopes: Callable taking the request (and view arguments) and
+            returning the version scopes the response depends on
+    
+    Responses carry an X-Cache header of HIT or MISS. Cached responses
+    with an ETag or Last-Modified header answer conditional requests with
+    304 Not Modified.
+    """
+    def decorator(view):
+        name = view.__name__
+        CACHED_VIEWS.append(name)
+        
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.VIEW_CACHE_SECONDS or not _is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+            
+            url = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+            key = PAGE_KEY.format(name, url, version_key(scopes(request, *args, **kwargs)))
+            
+            response = cache.get(key)
+            if response is not None:
+                _count(name, 'hit')
+                # Answer conditional requests from the cached validators
+                last_modified = response.get('Last-Modified')
+                response = get_conditional_response(
+                    request,
+                    etag=response.get('ETag'),
+                    last_modified=last_modified and parse_http_date_safe(last_modified),
+                    response=response,
+                )
+                response['X-Cache'] = 'HIT'
+                return response
+            
+            response = view(request, *args, **kwargs)
+            if _is_cacheable_response(request, response):
+                cache.set(key, response, settings.VIEW_CACHE_SECONDS)
+            _count(name, 'miss')
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def all_issues(request, *args, **kwargs):
+    """Scope for pages that depend on every issue"""
+    return {'all'}
+
+
+def filtered_issues(request, *args, **kwargs):
+    """
+    Scope for pages filtered by ?category= and/or ?status=
+    
+    Only issues in that category (or status) can appear, so changes
+    elsewhere leave the page cached. The filters are validated like the
+    issue list does; invalid ones are ignored there, so the page then
+    depends on every issue.
+    """
+    form = IssueFilterForm(request.GET)
+    if not form.is_valid():
+        return {'all'}
+    scopes = issue_scopes(form.cleaned_data.get('category'), form.cleaned_data.get('status'))
+    if len(scopes) > 1:
+        scopes.discard('all')
+    return scopes
+
+
+def resolved_issues(request, *args, **kwargs):
+    """Scope for pages listing resolved issues only"""
+    return {'status:resolved'}
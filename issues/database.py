@@ -0,0 +1,74 @@
+"""
+SQLite connection tuning and lock handling
+With DATABASE_PROFILE=production every new SQLite connection is configured
+from settings.SQLITE_PRAGMAS (WAL journal, synchronous=NORMAL, a larger page
+cache, memory-mapped reads and a busy timeout) so several worker processes
+can read while one writes. Connections are kept open between requests with
+CONN_MAX_AGE.
+
+SQLite lets only one connection write at a time. A writer waits up to the
+busy timeout for the lock, except when its transaction has already read:
+upgrading it could deadlock, so SQLite fails at once with "database is
+locked". atomic_with_retry() runs such read-then-write transactions again
+from the start.
+"""
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Seconds before the first retry; later ones back off exponentially
+RETRY_DELAY = 0.05
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def configure_connection(sender, connection, **kwargs):
+    """connection_created handler applying SQLITE_PRAGMAS to new connections"""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRAGMAS:
+        return
+    # Use the DB-API connection so the set-up is not counted against the
+    # query budget of the request that opened the connection
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def is_locked_error(exc):
+    return isinstance(exc, OperationalError) and any(
+        message in str(exc).lower() for message in LOCKED_MESSAGES
+    )
+
+
+def atomic_with_retry(func, *args, using='default', **kwargs):
+    """
+    Run func(*args, **kwargs) in a transaction, retrying it while locked
+    
+    Only an outermost transaction is retried: inside another atomic block
+    the enclosing transaction holds the stale read and has to be retried
+    by its caller, so the error is raised. func must be safe to run again
+    after a rollback.
+    
+    Returns:
+        What func returns
+    """
+    connection = connections[using]
+    retries = settings.DATABASE_LOCK_RETRIES
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        retries = 0
+    
+    attempt = 0
+    while True:
+        try:
+            with transaction.atomic(using=using):
+                return func(*args, **kwargs)
+        except OperationalError as exc:
+            if attempt >= retries or not is_locked_error(exc):
+                raise
+            attempt += 1
+            delay = RETRY_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            logger.info('%s: %s, retry %d of %d in %.0f ms', func.__name__, exc, attempt, retries, delay * 1000)
+            time.sleep(delay)
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Issue, IssueUpdate, Comment, IssuePhoto
+from .images import normalize_upload
 
 
 class MultipleFileInput(forms.ClearableFileInput):
@@ -48,6 +49,14 @@ class IssueCreateForm(forms.ModelForm):
                 self.fields[field].widget.attrs.update({
                     'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent'
                 })
+    
+    def clean_photo_before(self):
+        photo = self.cleaned_data.get('photo_before')
+        return normalize_upload(photo) if photo else photo
+    
+    def clean_additional_photos(self):
+        photos = self.cleaned_data.get('additional_photos') or []
+        return [normalize_upload(photo) for photo in photos]
 
 
 class IssueUpdateForm(forms.ModelForm):
@@ -66,6 +75,10 @@ class IssueUpdateForm(forms.ModelForm):
             self.fields[field].widget.attrs.update({
                 'class': 'w-full px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent'
             })
+    
+    def clean_photo_after(self):
+        photo = self.cleaned_data.get('photo_after')
+        return normalize_upload(photo) if photo else photo
 
 
 class CommentForm(forms.ModelForm):
@@ -91,6 +104,11 @@ class CommentForm(forms.ModelForm):
 class IssueFilterForm(forms.Form):
     """Form for filtering issues"""
     
+    q = forms.CharField(
+        max_length=200,
+        required=False,
+        widget=forms.TextInput(attrs={'placeholder': 'Search titles, descriptions, addresses and comments'})
+    )
     category = forms.ChoiceField(
         choices=[('', 'All Categories')] + Issue.CATEGORY_CHOICES,
         required=False
@@ -119,3 +137,4 @@ class IssueFilterForm(forms.Form):
             self.fields[field].widget.attrs.update({
                 'class': 'px-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent'
             })
+        self.fields['q'].widget.attrs['class'] += ' w-full'
@@ -0,0 +1,176 @@
+"""
+Geospatial helpers for issue locations
+Includes geohash encoding, bounding-box cover queries and vectorized
+Haversine distance kernels
+"""
+from math import atan, ceil, cos, degrees, pi, radians, sinh
+
+EARTH_RADIUS_KM = 6371.0
+
+GEOHASH_PRECISION = 9
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(lat, lon, precision=GEOHASH_PRECISION):
+    """
+    Encode a coordinate as a geohash string
+    
+    Args:
+        lat, lon: Coordinates in degrees
+        precision: Number of characters in the geohash
+    
+    Returns:
+        Geohash string
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    lat, lon = float(lat), float(lon)
+    
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """Return the (lat, lon) size in degrees of a geohash cell"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def geohash_cover(south, west, north, east, max_cells=16):
+    """
+    Cover a bounding box with as few geohash cells as practical
+    
+    Picks the finest precision at which the box spans at most max_cells
+    cells, so that a prefix range scan on each cell stays selective.
+    
+    Returns:
+        Sorted list of geohash prefixes
+    """
+    south, north = max(south, -90.0), min(north, 90.0)
+    west, east = max(west, -180.0), min(east, 180.0)
+    
+    cells = ['']
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        lat_size, lon_size = geohash_cell_size(precision)
+        rows = int(north // lat_size - south // lat_size) + 1
+        cols = int(east // lon_size - west // lon_size) + 1
+        if rows * cols > max_cells:
+            break
+        cells = {
+            encode_geohash(
+                min(south + row * lat_size, north),
+                min(west + col * lon_size, east),
+                precision,
+            )
+            for row in range(rows + 1)
+            for col in range(cols + 1)
+        }
+    return sorted(cells)
+
+
+def radius_bbox(lat, lon, radius_km):
+    """Return the (south, west, north, east) box enclosing a circle"""
+    lat, lon = float(lat), float(lon)
+    dlat = radius_km / EARTH_RADIUS_KM * 57.29577951308232
+    dlon = dlat / max(cos(radians(lat)), 1e-6)
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+def parse_bbox(value):
+    """
+    Parse a 'south,west,north,east' query string value
+    
+    Boxes crossing the antimeridian (west > east) are invalid; clients
+    request the two halves separately.
+    
+    Returns:
+        Tuple of floats, or None if the value is missing or invalid
+    """
+    try:
+        south, west, north, east = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        return None
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        return None
+    return south, west, north, east
+
+
+def tile_bbox(zoom, x, y):
+    """
+    Bounding box of a Web Mercator (slippy map) tile
+    
+    Returns:
+        Tuple of (south, west, north, east) in degrees
+    """
+    n = 2 ** zoom
+    
+    def tile_lat(row):
+        return degrees(atan(sinh(pi * (1 - 2 * row / n))))
+    
+    return tile_lat(y + 1), x / n * 360.0 - 180.0, tile_lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+def cluster_precision(zoom, cells_per_tile=8):
+    """Geohash precision giving roughly cells_per_tile clusters across a tile"""
+    lon_bits = zoom + cells_per_tile.bit_length() - 1
+    return max(1, min(GEOHASH_PRECISION, ceil(2 * lon_bits / 5)))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in kilometers
+    
+    Accepts scalars or NumPy arrays and broadcasts them against each other,
+    so one point can be compared against N points in a single call.
+    Missing coordinates (NaN) produce NaN distances.
+    """
+    # Imported here so loading the models does not pull in NumPy
+    import numpy as np
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2)
+    )
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def pairwise_haversine_km(points_a, points_b):
+    """
+    Distance matrix between two sets of points
+    
+    Args:
+        points_a: Array-like of shape (N, 2) with (lat, lon) rows
+        points_b: Array-like of shape (M, 2) with (lat, lon) rows
+    
+    Returns:
+        Array of shape (N, M) with distances in kilometers
+    """
+    import numpy as np
+    points_a = np.asarray(points_a, dtype=np.float64).reshape(-1, 2)
+    points_b = np.asarray(points_b, dtype=np.float64).reshape(-1, 2)
+    return haversine_km(
+        points_a[:, 0:1], points_a[:, 1:2],
+        points_b[:, 0][np.newaxis, :], points_b[:, 1][np.newaxis, :],
+    )
@@ -0,0 +1,122 @@
+"""
+Image derivatives for issue photos
+Originals are normalised on upload (EXIF stripped, oversize images scaled
+down) and resized thumbnails are generated lazily and cached in storage
+"""
+from hashlib import sha1
+from io import BytesIO
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+logger = logging.getLogger(__name__)
+
+# Longest side of stored originals, in pixels
+MAX_ORIGINAL_SIZE = 2560
+
+# Thumbnail widths; requested widths are rounded up to one of these
+THUMBNAIL_WIDTHS = (320, 640, 1280)
+
+THUMBNAIL_DIR = 'thumbs'
+
+
+def _encode(image, fmt, quality=85):
+    buffer = BytesIO()
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(buffer, fmt, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def normalize_upload(uploaded_file):
+    """
+    Strip metadata from an uploaded photo and scale it down if oversize
+    
+    The EXIF orientation is applied to the pixels before metadata is
+    dropped. Files Pillow cannot read are returned unchanged.
+    
+    Returns:
+        ContentFile with the re-encoded image, or the original file
+    """
+    try:
+        uploaded_file.seek(0)
+        image = Image.open(uploaded_file)
+        fmt = image.format
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError):
+        uploaded_file.seek(0)
+        return uploaded_file
+    
+    image.thumbnail((MAX_ORIGINAL_SIZE, MAX_ORIGINAL_SIZE))
+    fmt = fmt if fmt in ('PNG', 'WEBP') else 'JPEG'
+    name, _ = os.path.splitext(os.path.basename(uploaded_file.name))
+    extension = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}[fmt]
+    return ContentFile(_encode(image, fmt), name=f'{name}.{extension}')
+
+
+def thumbnail_format():
+    return 'WEBP' if features.check('webp') else 'JPEG'
+
+
+def thumbnail_width(width):
+    """Round a requested width up to the nearest configured thumbnail width"""
+    for candidate in THUMBNAIL_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def thumbnail_name(name, width, fmt=None):
+    """Storage path of the thumbnail of an original image"""
+    fmt = fmt or thumbnail_format()
+    digest = sha1(name.encode()).hexdigest()
+    extension = 'webp' if fmt == 'WEBP' else 'jpg'
+    return f'{THUMBNAIL_DIR}/{width}/{digest[:2]}/{digest}.{extension}'
+
+
+def get_thumbnail(name, width, storage=default_storage):
+    """
+    Return the storage path of a thumbnail, generating it on first use
+    
+    Args:
+        name: Storage path of the original image
+        width: Requested width in pixels
+    
+    Returns:
+        Thumbnail path, or the original path if it cannot be read
+    """
+    width = thumbnail_width(width)
+    fmt = thumbnail_format()
+    path = thumbnail_name(name, width, fmt)
+    if storage.exists(path):
+        return path
+    
+    try:
+        with storage.open(name) as original:
+            image = ImageOps.exif_transpose(Image.open(original))
+            image.thumbnail((width, width * 4))
+            data = _encode(image, fmt, quality=80)
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        logger.warning('Could not create thumbnail for %s', name)
+        return name
+    
+    if not storage.exists(path):
+        storage.save(path, ContentFile(data))
+    return path
+
+
+def thumbnail_url(fieldfile, width):
+    """URL of a resized copy of an image field file, or '' if empty"""
+    if not fieldfile:
+        return ''
+    return fieldfile.storage.url(get_thumbnail(fieldfile.name, width, fieldfile.storage))
+
+
+def warm_thumbnails(fieldfile):
+    """Generate all configured thumbnail sizes for an image"""
+    if fieldfile:
+        for width in THUMBNAIL_WIDTHS:
+            get_thumbnail(fieldfile.name, width, fieldfile.storage)
@@ -0,0 +1,242 @@
+"""
+Per-view SQL and latency instrumentation
+InstrumentationMiddleware counts the SQL queries, database time and wall
+time of every request. They are added to the response as X-DB-Queries and
+Server-Timing headers and aggregated per view for the Prometheus /metrics
+endpoint. Views declare how many queries a request may run with
+@query_budget; requests over budget are logged and counted so N+1 query
+regressions show up in tests and in production.
+"""
+from contextlib import ExitStack
+import ipaddress
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'issue_tracker'
+
+# Histogram bucket upper bounds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+UNMATCHED_VIEW = 'unmatched'
+
+
+def query_budget(max_queries):
+    """
+    Declare the most SQL queries one request to a view may run
+    
+    The budget covers the whole request, including the session and user
+    lookups done by middleware, and must not grow with the amount of data.
+    It applies to GET and HEAD requests; writes also run the signal
+    handlers and are not budgeted.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def get_query_budget(view):
+    """Budget declared for a view function, or None"""
+    return getattr(view, 'query_budget', None)
+
+
+class QueryRecorder:
+    """Database execute wrapper that counts queries and the time spent in them"""
+    
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+    
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus layout"""
+    
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+    
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+        self.total += 1
+        self.sum += value
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.requests = {}
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_seconds = 0.0
+        self.over_budget = 0
+
+
+class MetricsRegistry:
+    """Request metrics of this process, aggregated per view"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+    
+    def reset(self):
+        with self._lock:
+            self._views = {}
+    
+    def observe(self, view, method, status, duration, queries, db_duration, over_budget=False):
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = ViewMetrics()
+            key = (method, str(status))
+            metrics.requests[key] = metrics.requests.get(key, 0) + 1
+            metrics.duration.observe(duration)
+            metrics.queries.observe(queries)
+            metrics.db_seconds += db_duration
+            if over_budget:
+                metrics.over_budget += 1
+    
+    def snapshot(self):
+        """Per-view totals as plain dicts, e.g. for the admin dashboard or tests"""
+        with self._lock:
+            return {
+                view: {
+                    'requests': sum(metrics.requests.values()),
+                    'queries': int(metrics.queries.sum),
+                    'db_seconds': metrics.db_seconds,
+                    'seconds': metrics.duration.sum,
+                    'over_budget': metrics.over_budget,
+                }
+                for view, metrics in self._views.items()
+            }
+    
+    def render(self):
+        """Metrics in the Prometheus text exposition format"""
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = []
+            
+            name = f'{METRIC_PREFIX}_http_requests_total'
+            lines += [f'# HELP {name} Requests handled, by view, method and status.', f'# TYPE {name} counter']
+            for view, metrics in views:
+                for (method, status), count in sorted(metrics.requests.items()):
+                    lines.append(f'{name}{_labels(view=view, method=method, status=status)} {count}')
+            
+            for name, help_text, attribute in (
+                (f'{METRIC_PREFIX}_http_request_duration_seconds', 'Wall time of requests, by view.', 'duration'),
+                (f'{METRIC_PREFIX}_db_queries_per_request', 'SQL queries run per request, by view.', 'queries'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for view, metrics in views:
+                    histogram = getattr(metrics, attribute)
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{_labels(view=view, le=_number(bound))} {count}')
+                    lines.append(f'{name}_bucket{_labels(view=view, le="+Inf")} {histogram.total}')
+                    lines.append(f'{name}_sum{_labels(view=view)} {_number(histogram.sum)}')
+                    lines.append(f'{name}_count{_labels(view=view)} {histogram.total}')
+            
+            for name, help_text, attribute in (
+                (f'{METRIC_PREFIX}_db_query_duration_seconds_total', 'Time spent in SQL queries, by view.', 'db_seconds'),
+                (f'{METRIC_PREFIX}_query_budget_exceeded_total', 'Requests over the view query budget.', 'over_budget'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for view, metrics in views:
+                    lines.append(f'{name}{_labels(view=view)} {_number(getattr(metrics, attribute))}')
+        return '\n'.join(lines) + '\n'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(**labels):
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+registry = MetricsRegistry()
+
+
+class InstrumentationMiddleware:
+    """
+    Measure each request and report it in headers and the metrics registry
+    
+    Place it first in MIDDLEWARE so the timings include the other
+    middleware. Queries run while a streaming response is being consumed
+    happen after the middleware returns and are not counted.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        if not settings.INSTRUMENTATION_ENABLED:
+            return self.get_response(request)
+        
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        
+        match = request.resolver_match
+        view = match.view_name if match else UNMATCHED_VIEW
+        budget = get_query_budget(match.func) if match and request.method in ('GET', 'HEAD') else None
+        over_budget = budget is not None and recorder.count > budget
+        if over_budget:
+            logger.warning(
+                '%s ran %d SQL queries, over its budget of %d (%s)',
+                view, recorder.count, budget, request.path,
+            )
+        
+        response['X-DB-Queries'] = str(recorder.count)
+        if budget is not None:
+            response['X-DB-Query-Budget'] = str(budget)
+        response['Server-Timing'] = (
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries", '
+            f'total;dur={duration * 1000:.1f}'
+        )
+        registry.observe(view, request.method, response.status_code, duration,
+                         recorder.count, recorder.duration, over_budget)
+        return response
+
+
+def _is_allowed_address(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for the metrics of this process"""
+    if not (
+        _is_allowed_address(request.META.get('REMOTE_ADDR', ''))
+        or (request.user.is_authenticated and request.user.is_staff)
+    ):
+        return HttpResponseForbidden('Forbidden')
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
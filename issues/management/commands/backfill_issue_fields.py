@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from issues import backfill
+
+
+class Command(BaseCommand):
+    help = 'Fill in derived issue columns (geohash, urgency_rank) on rows written without Issue.save()'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=backfill.BACKFILL_CHUNK_SIZE)
+    
+    def handle(self, *args, **options):
+        counts = backfill.backfill(chunk_size=options['chunk_size'])
+        summary = ', '.join(f'{count} {column}' for column, count in counts.items()) or 'nothing'
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {summary}'))
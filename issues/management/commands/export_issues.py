@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from issues import bulk
+from issues.models import Issue
+
+
+class Command(BaseCommand):
+    help = 'Export issues to a CSV, NDJSON or Parquet file, streaming them in batches'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or '-' for standard output")
+        parser.add_argument('--format', choices=bulk.FORMATS, help='Default: from the file extension, or CSV')
+        parser.add_argument(
+            '--category', action='append', choices=[c for c, _ in Issue.CATEGORY_CHOICES],
+            help='Only export the given category (can be repeated)',
+        )
+        parser.add_argument(
+            '--status', action='append', choices=[s for s, _ in Issue.STATUS_CHOICES],
+            help='Only export the given status (can be repeated)',
+        )
+        parser.add_argument('--since', help='Only export issues created on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=bulk.DEFAULT_BATCH_SIZE)
+    
+    def handle(self, *args, **options):
+        path = options['path']
+        issues = Issue.objects.all()
+        if options['category']:
+            issues = issues.filter(category__in=options['category'])
+        if options['status']:
+            issues = issues.filter(status__in=options['status'])
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('--since must be a YYYY-MM-DD date')
+            issues = issues.filter(created_at__date__gte=since)
+        
+        try:
+            format = options['format'] or ('csv' if path == '-' else bulk.detect_format(path))
+            rows = bulk.export_rows(issues, options['batch_size'])
+            if path == '-':
+                count = bulk.write_rows(rows, self.stdout, format, options['batch_size'])
+            elif format == 'parquet':
+                count = bulk.write_rows(rows, path, format, options['batch_size'])
+            else:
+                with open(path, 'w', newline='', encoding='utf-8') as out:
+                    count = bulk.write_rows(rows, out, format, options['batch_size'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+        
+        # Keep standard output clean for the exported data
+        self.stderr.write(self.style.SUCCESS(f'Exported {count} issues'))
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import User
+from issues import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Import issues from a CSV, NDJSON or Parquet file (e.g. an export of a legacy 311 system). '
+        'Rows are streamed and written in batches, so memory does not grow with the file.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input")
+        parser.add_argument('--format', choices=bulk.FORMATS, help='Default: from the file extension')
+        parser.add_argument('--user', help='Username of the reporter for rows without a known user')
+        parser.add_argument('--batch-size', type=int, default=bulk.DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Suggest priorities and find duplicate candidates for the imported issues',
+        )
+        parser.add_argument('--skip-invalid', action='store_true', help='Report invalid rows and carry on')
+    
+    def handle(self, *args, **options):
+        default_user = None
+        if options['user']:
+            default_user = User.objects.filter(username=options['user']).first()
+            if default_user is None:
+                raise CommandError(f"Unknown user {options['user']!r}")
+        
+        def report(number, message):
+            self.stderr.write(f'Row {number}: {message}')
+        
+        start = time.perf_counter()
+        try:
+            format = bulk.detect_format(options['path'], options['format'])
+            result = bulk.import_issues(
+                bulk.read_rows(options['path'], format, options['batch_size']),
+                default_user=default_user,
+                batch_size=options['batch_size'],
+                analyze=options['analyze'],
+                on_invalid=report if options['skip_invalid'] else None,
+            )
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'{exc} (earlier batches were imported; run again to resume)') from exc
+        elapsed = time.perf_counter() - start
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} issues in {elapsed:.1f}s "
+            f"({result['created'] / max(elapsed, 1e-9):.0f} rows/s); "
+            f"skipped {result['existing']} existing and {result['invalid']} invalid rows"
+        ))
@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from issues import sync
+
+
+class Command(BaseCommand):
+    help = 'Delete sync change log entries older than the retention period'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90,
+                            help='Keep entries from the last N days (clients older than this resync)')
+    
+    def handle(self, *args, **options):
+        deleted = sync.prune(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} change log entries'))
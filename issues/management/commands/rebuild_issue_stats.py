@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from issues import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed issue statistics from the Issue table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        stats.rebuild(chunk_size=options['chunk_size'])
+        summary = stats.get_summary()
+        self.stdout.write(self.style.SUCCESS(f"Issue statistics rebuilt for {summary['total']} issues"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from issues import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of issues and comments'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+    
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write('The database has no full-text index; search uses substring matching')
+            return
+        count = search.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt for {count} issues'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from issues.models import Issue
+from issues.ai_utils import get_similarity_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-category duplicate detection index from open issues'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--category', action='append', choices=[c for c, _ in Issue.CATEGORY_CHOICES],
+            help='Only rebuild the given category (can be repeated)',
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        categories = options['category'] or [c for c, _ in Issue.CATEGORY_CHOICES]
+        batch_size = options['batch_size']
+
+        for category in categories:
+            index = get_similarity_index(category)
+            index.clear()
+            rows = (
+                Issue.objects.filter(category=category, status__in=Issue.OPEN_STATUSES)
+                .values_list('id', 'title', 'description')
+                .iterator(chunk_size=batch_size)
+            )
+            batch = []
+            for pk, title, description in rows:
+                batch.append((pk, f"{title} {description}"))
+                if len(batch) >= batch_size:
+                    index.add_many(batch, save=False)
+                    batch = []
+            index.add_many(batch, save=False)
+            index.save()
+            self.stdout.write(f'{category}: indexed {len(index)} open issues')
+
+        self.stdout.write(self.style.SUCCESS('Similarity index rebuilt'))
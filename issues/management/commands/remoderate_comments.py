@@ -0,0 +1,121 @@
+import multiprocessing
+import time
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from issues.models import Comment, Issue
+from issues import caching, search, sync
+from issues.ai_utils import ToxicityFilter
+
+
+def _init_worker():
+    # Spawned workers start with a fresh interpreter
+    django.setup()
+
+
+def classify_batch(batch, threshold=None):
+    """
+    Return the comments of a batch whose toxicity flag should change
+    
+    Args:
+        batch: List of (pk, text, is_toxic) tuples
+        threshold: Number of distinct toxic words to flag a comment
+    
+    Returns:
+        List of (pk, new is_toxic) tuples
+    """
+    flags = ToxicityFilter.is_toxic_batch([text for _, text, _ in batch], threshold)
+    return [(pk, flag) for (pk, _, was_toxic), flag in zip(batch, flags) if flag != was_toxic]
+
+
+def _classify_batch_args(args):
+    return classify_batch(*args)
+
+
+def save_flags(changes):
+    """Store changed flags and do the work of the Comment signal handlers"""
+    now = timezone.now()
+    pks = [pk for pk, _ in changes]
+    with transaction.atomic():
+        Comment.objects.bulk_update(
+            [Comment(pk=pk, is_toxic=flag, updated_at=now) for pk, flag in changes],
+            ['is_toxic', 'updated_at'],
+            batch_size=1000,
+        )
+        comments = list(Comment.objects.filter(pk__in=pks).only('pk', 'issue_id'))
+        issues = {
+            issue['pk']: issue
+            for issue in Issue.objects.filter(pk__in={comment.issue_id for comment in comments})
+            .values('pk', 'issue_id', 'category', 'status', 'assigned_to_id')
+        }
+        # Hidden comments are not searchable
+        search.index_issues(list(issues))
+        # Newly hidden comments reach sync clients as tombstones
+        sync.record_saved_children('comment', comments, issues)
+        scopes = set()
+        for issue in issues.values():
+            scopes |= caching.issue_scopes(issue['category'], issue['status'])
+        caching.invalidate(scopes)
+
+
+class Command(BaseCommand):
+    help = 'Re-run the toxicity filter over existing comments and update their flags'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Classify batches in a pool of worker processes',
+        )
+        parser.add_argument('--threshold', type=int, help='Override TOXICITY_THRESHOLD')
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without saving them')
+
+    def batches(self, chunk_size):
+        rows = Comment.objects.order_by('pk').values_list('pk', 'text', 'is_toxic').iterator(chunk_size=chunk_size)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        threshold = options['threshold']
+        total = Comment.objects.count()
+        processed = flagged = cleared = 0
+        started = time.monotonic()
+
+        pool = None
+        if options['processes'] > 1:
+            pool = multiprocessing.Pool(options['processes'], initializer=_init_worker)
+            results = pool.imap(
+                _classify_batch_args,
+                ((batch, threshold) for batch in self.batches(chunk_size)),
+            )
+        else:
+            results = (classify_batch(batch, threshold) for batch in self.batches(chunk_size))
+
+        try:
+            for changes in results:
+                processed = min(processed + chunk_size, total)
+                flagged += sum(1 for _, flag in changes if flag)
+                cleared += sum(1 for _, flag in changes if not flag)
+                if changes and not options['dry_run']:
+                    save_flags(changes)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'{processed}/{total} comments checked, {flagged} newly flagged, '
+                    f'{cleared} cleared ({processed / max(elapsed, 1e-9):.0f}/s)'
+                )
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {flagged + cleared} comment(s)'))
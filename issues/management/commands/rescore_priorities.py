@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from issues.ai_utils import PriorityClassifier
+from issues.models import Issue
+
+
+class Command(BaseCommand):
+    help = 'Recompute suggested priorities for the issue backlog in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-score closed issues as well as open ones')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        issues = Issue.objects.all()
+        if not options['all']:
+            issues = issues.filter(status__in=Issue.OPEN_STATUSES)
+        chunk_size = options['chunk_size']
+
+        scanned = updated = 0
+        last_pk = None
+        while True:
+            chunk = issues.order_by('pk')
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            chunk = list(chunk.only('pk', 'title', 'description', 'suggested_priority')[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            scanned += len(chunk)
+
+            priorities = PriorityClassifier.suggest_priorities(
+                PriorityClassifier.issue_text(issue.title, issue.description) for issue in chunk
+            )
+            changed = []
+            for issue, priority in zip(chunk, priorities):
+                if issue.suggested_priority != priority:
+                    issue.suggested_priority = priority
+                    changed.append(issue)
+            Issue.objects.bulk_update(changed, ['suggested_priority'])
+            updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f"Re-scored {scanned} issues, {updated} suggested priorities changed"))
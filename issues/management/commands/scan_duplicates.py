@@ -0,0 +1,134 @@
+import json
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from issues.models import Issue
+from issues.ai_utils import DuplicateDetector, SimilarityIndex
+from issues.geo import pairwise_haversine_km
+
+
+class Command(BaseCommand):
+    help = (
+        'Scan all open issues for candidate duplicates and write clusters as JSON lines. '
+        'Issues are compared chunk by chunk, so memory is bounded by the chunk size.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--category', action='append', choices=[c for c, _ in Issue.CATEGORY_CHOICES],
+            help='Only scan the given category (can be repeated)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--threshold', type=float, default=0.6, help='Minimum text similarity (0-1)')
+        parser.add_argument(
+            '--max-distance-km', type=float, default=DuplicateDetector.MAX_DISTANCE_KM,
+            help='Maximum distance between located issues',
+        )
+        parser.add_argument('--output', help='File to write clusters to (default: stdout)')
+
+    def handle(self, *args, **options):
+        self.chunk_size = options['chunk_size']
+        self.threshold = options['threshold']
+        self.max_distance_km = options['max_distance_km']
+        categories = options['category'] or [c for c, _ in Issue.CATEGORY_CHOICES]
+
+        out = open(options['output'], 'w') if options['output'] else self.stdout
+        try:
+            total = 0
+            for category in categories:
+                for cluster in self.scan_category(category):
+                    out.write(json.dumps(cluster) + '\n')
+                    total += 1
+        finally:
+            if out is not self.stdout:
+                out.close()
+
+        self.stderr.write(self.style.SUCCESS(f'Found {total} duplicate cluster(s)'))
+
+    def open_issues(self, category):
+        return Issue.objects.filter(category=category, status__in=Issue.OPEN_STATUSES).order_by('id')
+
+    def chunks(self, category, after_id=0):
+        """Yield chunks of open issues by primary key keyset"""
+        while True:
+            rows = list(
+                self.open_issues(category)
+                .filter(id__gt=after_id)
+                .values_list('id', 'issue_id', 'title', 'description', 'latitude', 'longitude')[:self.chunk_size]
+            )
+            if not rows:
+                return
+            yield rows
+            after_id = rows[-1][0]
+
+    def prepare(self, rows, idf):
+        """Vectorize a chunk into normalised TF-IDF rows and a coordinate array"""
+        counts = SimilarityIndex.vectorize([f'{title} {description}' for _, _, title, description, _, _ in rows])
+        points = np.array(
+            [
+                (np.nan, np.nan) if lat is None or lon is None else (float(lat), float(lon))
+                for _, _, _, _, lat, lon in rows
+            ],
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        return SimilarityIndex.weight(counts, idf), points
+
+    def scan_category(self, category):
+        # Pass 1: document frequencies over the whole category, in a fixed-size array
+        document_frequency = np.zeros(SimilarityIndex.N_FEATURES, dtype=np.int64)
+        n_documents = 0
+        for rows in self.chunks(category):
+            counts = SimilarityIndex.vectorize([f'{title} {description}' for _, _, title, description, _, _ in rows])
+            document_frequency += SimilarityIndex.document_frequency(counts)
+            n_documents += len(rows)
+        if n_documents < 2:
+            return
+        idf = SimilarityIndex.idf(document_frequency, n_documents)
+
+        # Pass 2: compare every chunk with itself and every later chunk
+        parent = {}
+        issue_ids = {}
+        best = {}
+
+        def find(pk):
+            while parent[pk] != pk:
+                parent[pk] = parent[parent[pk]]
+                pk = parent[pk]
+            return pk
+
+        for left in self.chunks(category):
+            left_vectors, left_points = self.prepare(left, idf)
+            for right in self.chunks(category, after_id=left[0][0] - 1):
+                right_vectors, right_points = self.prepare(right, idf)
+                similarities = (left_vectors @ right_vectors.T).toarray()
+                distances = pairwise_haversine_km(left_points, right_points)
+
+                # Issues without coordinates are matched on text alone
+                close = np.isnan(distances) | (distances <= self.max_distance_km)
+                matches = (similarities >= self.threshold) & close
+                if right[0][0] == left[0][0]:
+                    matches = np.triu(matches, k=1)
+
+                for i, j in zip(*np.nonzero(matches)):
+                    a, b = left[i], right[j]
+                    for row in (a, b):
+                        if row[0] not in parent:
+                            parent[row[0]] = row[0]
+                            issue_ids[row[0]] = str(row[1])
+                    root_a, root_b = find(a[0]), find(b[0])
+                    similarity = float(similarities[i, j])
+                    if root_a != root_b:
+                        parent[root_b] = root_a
+                        best[root_a] = max(best.get(root_a, 0.0), best.pop(root_b, 0.0), similarity)
+                    else:
+                        best[root_a] = max(best.get(root_a, 0.0), similarity)
+
+        clusters = {}
+        for pk in parent:
+            clusters.setdefault(find(pk), []).append(pk)
+        for root, members in clusters.items():
+            yield {
+                'category': category,
+                'issue_ids': [issue_ids[pk] for pk in sorted(members)],
+                'max_similarity': round(best[root], 4),
+            }
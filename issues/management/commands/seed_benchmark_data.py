@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from issues import bulk, synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic issues with status history and comments for load tests and benchmarks '
+        '(e.g. --issues 10000, 100000 or 1000000). Data is reproducible for a given --seed; '
+        'running again adds only the issues that are missing.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--issues', type=int, default=10000, help='Number of issues (default 10000)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--citizens', type=int, help='Reporters (default: one per 20 issues)')
+        parser.add_argument('--workers', type=int, default=25, help='Field workers (default 25)')
+        parser.add_argument('--comments-per-issue', type=float, default=1.5, help='Mean comments per issue')
+        parser.add_argument('--batch-size', type=int, default=bulk.DEFAULT_BATCH_SIZE)
+    
+    def handle(self, *args, **options):
+        if options['issues'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--issues must not be negative and --batch-size must be positive')
+        
+        def report(stage, count):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{stage}: {count}')
+        
+        start = time.perf_counter()
+        result = synthetic.seed(
+            options['issues'],
+            seed=options['seed'],
+            citizens=options['citizens'],
+            workers=options['workers'],
+            comments_per_issue=options['comments_per_issue'],
+            batch_size=options['batch_size'],
+            progress=report,
+        )
+        elapsed = time.perf_counter() - start
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['issues']} issues, {result['updates']} status updates and "
+            f"{result['comments']} comments in {elapsed:.1f}s; "
+            f"log in as {synthetic.USERNAME_PREFIX}admin with password {synthetic.PASSWORD!r}"
+        ))
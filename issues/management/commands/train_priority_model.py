@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from issues.ai_utils import PriorityClassifier
+from issues.models import Issue
+
+
+class Command(BaseCommand):
+    help = 'Train the priority classifier from historical issue urgency levels'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help='Model path (defaults to PRIORITY_MODEL_PATH)')
+        parser.add_argument('--holdout', type=float, default=0.2,
+                            help='Fraction of issues held back to report accuracy (0 to skip)')
+
+    def handle(self, *args, **options):
+        texts, labels = [], []
+        rows = Issue.objects.values_list('title', 'description', 'urgency_level').iterator(chunk_size=2000)
+        for title, description, urgency_level in rows:
+            texts.append(PriorityClassifier.issue_text(title, description))
+            labels.append(urgency_level)
+
+        if len(set(labels)) < 2:
+            raise CommandError('At least two different urgency levels are needed to train a model')
+
+        holdout = options['holdout']
+        if holdout > 0:
+            from sklearn.model_selection import train_test_split
+            try:
+                train_texts, test_texts, train_labels, test_labels = train_test_split(
+                    texts, labels, test_size=holdout, random_state=0, stratify=labels,
+                )
+            except ValueError:
+                raise CommandError('Not enough issues per urgency level for a holdout split; use --holdout 0')
+            model = PriorityClassifier.build_model().fit(train_texts, train_labels)
+            accuracy = model.score(test_texts, test_labels)
+            self.stdout.write(f"Holdout accuracy: {accuracy:.1%} on {len(test_texts)} issues")
+
+        model = PriorityClassifier.build_model().fit(texts, labels)
+        output = options['output'] or settings.PRIORITY_MODEL_PATH
+        PriorityClassifier.save_model(model, output)
+        self.stdout.write(self.style.SUCCESS(f"Priority model trained on {len(texts)} issues and saved to {output}"))
@@ -1,8 +1,52 @@
-from django.db import models
+from django.db import connections, models
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
 from django.conf import settings
 from django.utils import timezone
+from math import cos, radians
 import uuid
 
+from . import database, geo, postgres
+
+
+class IssueQuerySet(models.QuerySet):
+    """Spatial lookups backed by the geohash and coordinate indexes"""
+    
+    def in_bbox(self, south, west, north, east):
+        """Issues inside a (south, west, north, east) bounding box"""
+        if postgres.is_postgresql(connections[self.db]):
+            # The GiST index on the coordinates answers box queries directly
+            cells = postgres.in_box(south, west, north, east)
+        else:
+            cells = Q()
+            for cell in geo.geohash_cover(south, west, north, east):
+                # '{' sorts right after 'z', so this is a prefix range scan
+                cells |= Q(geohash__gte=cell, geohash__lt=cell + '{')
+        return self.filter(
+            cells,
+            latitude__range=(south, north),
+            longitude__range=(west, east),
+        )
+    
+    def with_distance(self, lat, lon):
+        """Annotate distance_km from a point using the Haversine formula"""
+        lat_rad, lon_rad = radians(float(lat)), radians(float(lon))
+        issue_lat = Radians(Cast(F('latitude'), FloatField()))
+        issue_lon = Radians(Cast(F('longitude'), FloatField()))
+        a = (
+            Power(Sin((issue_lat - lat_rad) / 2), 2)
+            + cos(lat_rad) * Cos(issue_lat) * Power(Sin((issue_lon - lon_rad) / 2), 2)
+        )
+        return self.annotate(distance_km=2 * geo.EARTH_RADIUS_KM * ASin(Sqrt(a)))
+    
+    def within_radius(self, lat, lon, radius_km):
+        """Issues within radius_km of a point, annotated with distance_km"""
+        return (
+            self.in_bbox(*geo.radius_bbox(lat, lon, radius_km))
+            .with_distance(lat, lon)
+            .filter(distance_km__lte=radius_km)
+        )
+
 
 class Issue(models.Model):
     """Main Issue model for tracking community problems"""
@@ -24,6 +68,9 @@ class Issue(models.Model):
         ('high', 'High'),
     ]
     
+    # Numeric severity so urgency sorts (and is indexed) by meaning, not alphabetically
+    URGENCY_RANKS = {'low': 1, 'medium': 2, 'high': 3}
+    
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('reviewed', 'Reviewed'),
@@ -33,6 +80,8 @@ class Issue(models.Model):
         ('rejected', 'Rejected'),
     ]
     
+    OPEN_STATUSES = ['pending', 'reviewed', 'assigned', 'in_progress']
+    
     # Unique identifier
     issue_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     
@@ -45,6 +94,7 @@ class Issue(models.Model):
     # Location
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False, db_index=True)
     address = models.TextField()
     
     # Photos
@@ -52,6 +102,7 @@ class Issue(models.Model):
     
     # Status and priority
     urgency_level = models.CharField(max_length=20, choices=URGENCY_CHOICES, default='medium')
+    urgency_rank = models.PositiveSmallIntegerField(default=2, editable=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     
     # Assignment
@@ -68,12 +119,30 @@ class Issue(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
     
+    # AI analysis, filled in by the background pipeline
+    suggested_priority = models.CharField(max_length=20, choices=URGENCY_CHOICES, blank=True)
+    duplicate_candidates = models.JSONField(default=list, blank=True)
+    ai_processed_at = models.DateTimeField(null=True, blank=True)
+    
+    objects = IssueQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['-created_at']),
-            models.Index(fields=['status']),
-            models.Index(fields=['category']),
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['-updated_at']),
+            models.Index(fields=['latitude', 'longitude']),
+            models.Index(fields=['status', 'resolved_at']),
+            # Issue list: one index per combination of filters, ending in the
+            # sort columns so every filter/sort pair is an ordered range scan
+            # (urgency_rank doubles as the urgency filter and the urgency sort)
+            models.Index(fields=['-urgency_rank', '-created_at', '-id']),
+            models.Index(fields=['category', '-created_at', '-id']),
+            models.Index(fields=['category', '-urgency_rank', '-created_at', '-id']),
+            models.Index(fields=['status', '-created_at', '-id']),
+            models.Index(fields=['status', '-urgency_rank', '-created_at', '-id']),
+            models.Index(fields=['category', 'status', '-created_at', '-id']),
+            models.Index(fields=['category', 'status', '-urgency_rank', '-created_at', '-id']),
         ]
     
     def __str__(self):
@@ -91,11 +160,39 @@ class Issue(models.Model):
     def is_resolved(self):
         return self.status == 'resolved'
     
-    def save(self, *args, **kwargs):
+    @property
+    def is_open(self):
+        return self.status in self.OPEN_STATUSES
+    
+    @property
+    def similarity_text(self):
+        """Text used for duplicate detection"""
+        return f"{self.title} {self.description}"
+    
+    def fill_derived_fields(self):
+        """Set the columns computed from other fields (bulk_create skips save())"""
         # Set resolved_at when status changes to resolved
         if self.status == 'resolved' and not self.resolved_at:
             self.resolved_at = timezone.now()
-        super().save(*args, **kwargs)
+        self.urgency_rank = self.URGENCY_RANKS.get(self.urgency_level, self.URGENCY_RANKS['medium'])
+        # Keep the spatial index column in sync with the coordinates
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+    
+    def save(self, *args, **kwargs):
+        self.fill_derived_fields()
+        adding, pk = self._state.adding, self.pk
+        
+        def save_in_transaction():
+            # A rolled back attempt may already have assigned a primary key
+            self._state.adding, self.pk = adding, pk
+            super(Issue, self).save(*args, **kwargs)
+        
+        # Signal handlers update the statistics rollups in the same transaction,
+        # which reads before it writes and is retried if SQLite reports a lock
+        database.atomic_with_retry(save_in_transaction)
 
 
 class IssuePhoto(models.Model):
@@ -127,6 +224,9 @@ class IssueUpdate(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['issue', '-timestamp']),
+        ]
     
     def __str__(self):
         return f"Update for {self.issue.issue_id} - {self.status}"
@@ -147,3 +247,86 @@ class Comment(models.Model):
     
     def __str__(self):
         return f"Comment by {self.user.username} on {self.issue.issue_id}"
+
+
+class IssueStat(models.Model):
+    """Precomputed issue counters, maintained incrementally on every change"""
+    
+    DIMENSION_CHOICES = [
+        ('total', 'Total'),
+        ('status', 'Status'),
+        ('category', 'Category'),
+        ('urgency', 'Urgency'),
+        ('resolution_days', 'Resolution Days'),
+    ]
+    
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=50, blank=True)
+    count = models.BigIntegerField(default=0)
+    value_sum = models.BigIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='unique_issue_stat'),
+        ]
+    
+    def __str__(self):
+        return f"{self.dimension}:{self.key} = {self.count}"
+
+
+class DailyIssueStat(models.Model):
+    """Issues opened and resolved per day and category"""
+    
+    date = models.DateField()
+    category = models.CharField(max_length=50)
+    opened = models.IntegerField(default=0)
+    resolved = models.IntegerField(default=0)
+    resolution_days_sum = models.BigIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['date', 'category']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='unique_daily_issue_stat'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.category}: +{self.opened} / -{self.resolved}"
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Append-only log of changes to assigned issues, read by the sync API
+    
+    Entries are written by signal handlers in the same transaction as the
+    change and scoped to the worker the issue is assigned to. `seq` is a
+    monotonic sequence that clients page through; deletions (and issues
+    reassigned away from a worker) are recorded as tombstones.
+    """
+    
+    MODEL_CHOICES = [
+        ('issue', 'Issue'),
+        ('issueupdate', 'Issue Update'),
+        ('comment', 'Comment'),
+    ]
+    
+    ACTION_CHOICES = [
+        ('upsert', 'Created or changed'),
+        ('delete', 'Deleted'),
+    ]
+    
+    seq = models.BigAutoField(primary_key=True)
+    assignee_id = models.BigIntegerField()
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    issue_uuid = models.UUIDField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['assignee_id', 'seq']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"#{self.seq} {self.action} {self.model}:{self.object_id}"
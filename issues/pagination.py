@@ -0,0 +1,73 @@
+"""
+Keyset (cursor) pagination helpers
+Cursors are opaque, URL-safe tokens encoding the sort key of the last row
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded"""
+
+
+def encode_cursor(*values):
+    """Encode sort key values (datetimes, numbers, strings) as a cursor token"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, count):
+    """
+    Decode a cursor token into its sort key values
+    
+    Args:
+        token: Cursor token from encode_cursor
+        count: Number of values the cursor must contain
+    
+    Returns:
+        List of values; ISO timestamps are returned as strings
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor('Malformed cursor') from exc
+    if not isinstance(values, list) or len(values) != count:
+        raise InvalidCursor('Malformed cursor')
+    return values
+
+
+def parse_datetime_value(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError) as exc:
+        raise InvalidCursor('Malformed cursor') from exc
+
+
+def keyset_filter(fields, values):
+    """
+    Build a filter selecting rows after a cursor in the given ordering
+    
+    Args:
+        fields: Ordering fields, prefixed with '-' for descending
+        values: Sort key values of the last row on the previous page
+    
+    Returns:
+        Q object, e.g. for ('-created_at', '-id'):
+        created_at <= v0 AND (created_at < v0 OR (created_at = v0 AND id < v1))
+        The redundant leading bound lets the database seek the index range.
+    """
+    first = fields[0]
+    bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+    condition = Q()
+    for position, field in enumerate(fields):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[position]})
+        for previous, value in zip(fields[:position], values):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+    return bound & condition
@@ -0,0 +1,96 @@
+"""
+PostgreSQL-native spatial and duplicate lookups
+On PostgreSQL the post_migrate handler adds a GiST index on the issue
+coordinates as a point, which IssueQuerySet.in_bbox() uses instead of the
+geohash prefix scans, and a pg_trgm GIN index on the issue text, which
+narrows the open issues compared by the duplicate detector. On other
+databases nothing is created and the portable queries are used.
+"""
+import logging
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+ISSUE_TABLE = 'issues_issue'
+LOCATION_INDEX = 'issues_issue_location_gist'
+TRIGRAM_INDEX = 'issues_issue_text_trgm'
+
+# Index expressions; queries must use the same expressions to match them
+LOCATION_EXPRESSION = 'point(longitude::float8, latitude::float8)'
+TEXT_EXPRESSION = "(title || ' ' || description)"
+
+# Most trigram-similar issues passed on to the TF-IDF comparison
+TRIGRAM_CANDIDATES = 200
+
+_trigram_available = {}
+
+
+def is_postgresql(connection):
+    return connection.vendor == 'postgresql'
+
+
+def create_indexes(using='default', **kwargs):
+    """Create the spatial and trigram indexes if needed (connected to post_migrate)"""
+    connection = connections[using]
+    if not is_postgresql(connection):
+        return
+    _trigram_available.pop(using, None)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {LOCATION_INDEX} ON {ISSUE_TABLE} USING gist ({LOCATION_EXPRESSION})"
+        )
+        try:
+            with transaction.atomic(using=using):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError as exc:
+            logger.warning('pg_trgm is not available, duplicate detection will not pre-filter by trigrams: %s', exc)
+            return
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} ON {ISSUE_TABLE} USING gin ({TEXT_EXPRESSION} gin_trgm_ops)"
+        )
+
+
+def has_trigram_index(connection):
+    """Whether pg_trgm is installed on this connection's database"""
+    if not is_postgresql(connection):
+        return False
+    if connection.alias not in _trigram_available:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_available[connection.alias] = cursor.fetchone() is not None
+    return _trigram_available[connection.alias]
+
+
+def in_box(south, west, north, east):
+    """Filter expression for issues inside a bounding box, using the GiST index"""
+    return RawSQL(
+        f"{LOCATION_EXPRESSION} <@ box(point(%s, %s), point(%s, %s))",
+        [float(west), float(south), float(east), float(north)],
+        output_field=BooleanField(),
+    )
+
+
+def trigram_candidates(queryset, text, limit=TRIGRAM_CANDIDATES):
+    """
+    Primary keys of the issues in queryset with text most like `text`
+    
+    Uses the pg_trgm similarity operator, which the trigram index answers
+    without reading every row; issues below pg_trgm.similarity_threshold
+    (0.3 by default) are left out.
+    
+    Returns:
+        List of primary keys, most similar first, or None when the database
+        has no trigram index
+    """
+    if not has_trigram_index(connections[queryset.db]):
+        return None
+    return list(
+        queryset
+        .filter(RawSQL(f"{TEXT_EXPRESSION} %% %s", [text], output_field=BooleanField()))
+        .alias(text_similarity=RawSQL(f"similarity({TEXT_EXPRESSION}, %s)", [text], output_field=FloatField()))
+        .order_by('-text_similarity', 'pk')
+        .values_list('pk', flat=True)[:limit]
+    )
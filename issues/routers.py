@@ -0,0 +1,149 @@
+"""
+Read replicas with read-your-writes pinning
+ReplicaRouter sends reads of the issues and accounts apps to the replica
+aliases in settings.DATABASE_REPLICAS and everything else to the primary.
+A request reads from one replica, chosen by weight at random or in
+round-robin order. Once a request writes, its later reads go to the
+primary, and ReplicaPinningMiddleware sets a short-lived cookie so the
+client's next requests do too until the replicas have caught up.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import random
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+ROUTED_APP_LABELS = {'issues', 'accounts'}
+PIN_COOKIE = 'read_primary'
+
+# Reads go to the primary: the client wrote recently, or code asked for it
+_pinned = ContextVar('replica_pinned', default=False)
+# The current request or task has written to the primary
+_wrote = ContextVar('replica_wrote', default=False)
+# Replica chosen for the current request, so its reads see one snapshot
+_replica = ContextVar('replica_alias', default=None)
+
+
+class ReplicaSelector:
+    """
+    Choose replica aliases in proportion to their weights
+    
+    'weighted' draws at random; 'round_robin' uses smooth weighted
+    round-robin, which interleaves the aliases instead of sending runs of
+    requests to the heaviest one.
+    """
+    
+    STRATEGIES = ('weighted', 'round_robin')
+    
+    def __init__(self, weights, strategy='weighted'):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f'Unknown replica selection {strategy!r}')
+        self.aliases = list(weights)
+        self.weights = [weights[alias] for alias in self.aliases]
+        self.strategy = strategy
+        self._current = [0] * len(self.aliases)
+        self._lock = threading.Lock()
+    
+    def choose(self):
+        if self.strategy == 'weighted':
+            return random.choices(self.aliases, self.weights)[0]
+        with self._lock:
+            for position, weight in enumerate(self.weights):
+                self._current[position] += weight
+            best = max(range(len(self.aliases)), key=self._current.__getitem__)
+            self._current[best] -= sum(self.weights)
+            return self.aliases[best]
+
+
+_selector = None
+_selector_lock = threading.Lock()
+
+
+def get_selector():
+    """Selector for the configured replicas, rebuilt when the settings change"""
+    global _selector
+    key = (tuple(settings.DATABASE_REPLICAS.items()), settings.DATABASE_REPLICA_SELECTION)
+    with _selector_lock:
+        if _selector is None or _selector[0] != key:
+            _selector = (key, ReplicaSelector(settings.DATABASE_REPLICAS, settings.DATABASE_REPLICA_SELECTION))
+        return _selector[1]
+
+
+def reads_from_primary():
+    return _pinned.get() or _wrote.get()
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary inside the block, e.g. in tasks run after a commit"""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReplicaRouter:
+    """Database router sending reads to replicas and writes to the primary"""
+    
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or model._meta.app_label not in ROUTED_APP_LABELS:
+            return None
+        # Reads inside a transaction on the primary belong to that transaction
+        if reads_from_primary() or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        replica = _replica.get()
+        if replica is None:
+            replica = get_selector().choose()
+            _replica.set(replica)
+        return replica
+    
+    def db_for_write(self, model, **hints):
+        if settings.DATABASE_REPLICAS and model._meta.app_label in ROUTED_APP_LABELS:
+            _wrote.set(True)
+        return PRIMARY
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the primary's rows
+        return True
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+class ReplicaPinningMiddleware:
+    """
+    Keep a client's reads on the primary for a while after it writes
+    
+    Routing state is reset for every request. Requests that carry the pin
+    cookie read from the primary; requests that write set the cookie for
+    DATABASE_REPLICA_PIN_SECONDS.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        
+        tokens = [
+            (_pinned, _pinned.set(PIN_COOKIE in request.COOKIES)),
+            (_wrote, _wrote.set(False)),
+            (_replica, _replica.set(None)),
+        ]
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(
+                    PIN_COOKIE, '1', max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                    httponly=True, samesite='Lax',
+                )
+            return response
+        finally:
+            for variable, token in tokens:
+                variable.reset(token)
@@ -0,0 +1,296 @@
+"""
+Full-text search over issues and their comments
+
+The index has one row per issue holding the title, description, address
+and the text of its visible comments. On SQLite it is an FTS5 virtual
+table (rowid is Issue.id) ranked with BM25; on PostgreSQL a table of
+weighted tsvector documents with a GIN index, ranked with ts_rank. It
+lives in the same database as the issues, so it is written inside the same
+transaction by the signal handlers. Other databases fall back to unranked
+substring matching.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+
+from .models import Issue, Comment
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from . import database
+
+SEARCH_TABLE = 'issues_issue_search'
+
+# Relative BM25 weights of the indexed columns
+COLUMN_WEIGHTS = (
+    ('title', 10.0),
+    ('description', 4.0),
+    ('address', 2.0),
+    ('comments', 1.0),
+)
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+# Words PostgreSQL parses as a single lexeme (no underscores)
+LEXEME_RE = re.compile(r'[^\W_]+', re.UNICODE)
+MAX_TERMS = 16
+
+# Text search configuration (stemming and stop words) used on PostgreSQL
+TEXT_SEARCH_CONFIG = 'english'
+
+
+def _connection():
+    return connections[router.db_for_write(Issue)]
+
+
+def is_supported(connection=None):
+    """Whether a ranked index is used on this connection"""
+    connection = connection or _connection()
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def create_index(using='default', **kwargs):
+    """Create the search table if needed (connected to post_migrate)"""
+    connection = connections[using]
+    if not is_supported(connection):
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} (issue_id bigint PRIMARY KEY, document tsvector NOT NULL)"
+            )
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document ON {SEARCH_TABLE} USING gin (document)")
+            return
+        columns = ', '.join(name for name, _ in COLUMN_WEIGHTS)
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            f"{columns}, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+
+
+def build_match(query):
+    """
+    Turn free text into a safe FTS5 MATCH expression
+    
+    Every word must match; the last one also matches as a prefix so partial
+    input finds results. Returns an empty string if there are no words.
+    """
+    terms = TERM_RE.findall(query or '')[:MAX_TERMS]
+    if not terms:
+        return ''
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def build_tsquery(query):
+    """Like build_match(), but a PostgreSQL to_tsquery() expression"""
+    terms = LEXEME_RE.findall(query or '')[:MAX_TERMS]
+    if not terms:
+        return ''
+    terms[-1] += ':*'
+    return ' & '.join(terms)
+
+
+def _rank_weights():
+    """ts_rank weights array {D, C, B, A} from the column weights"""
+    top = max(weight for _, weight in COLUMN_WEIGHTS)
+    return '{' + ', '.join(str(weight / top) for _, weight in reversed(COLUMN_WEIGHTS)) + '}'
+
+
+def _documents(issue_ids):
+    """Yield (id, title, description, address, comments) rows for the index"""
+    comments = {}
+    rows = (
+        Comment.objects.filter(issue_id__in=issue_ids, is_toxic=False)
+        .order_by('issue_id', 'created_at')
+        .values_list('issue_id', 'text')
+    )
+    for issue_id, text in rows:
+        comments.setdefault(issue_id, []).append(text)
+    
+    issues = Issue.objects.filter(pk__in=issue_ids).values_list('pk', 'title', 'description', 'address')
+    for pk, title, description, address in issues:
+        yield pk, title, description, address, '\n'.join(comments.get(pk, []))
+
+
+def index_issues(issue_ids):
+    """Add or refresh the index rows for the given issues"""
+    connection = _connection()
+    issue_ids = list(issue_ids)
+    if not is_supported(connection) or not issue_ids:
+        return
+    # Read the documents before the transaction starts: a SQLite transaction
+    # that begins with a write waits for a busy lock instead of failing
+    documents = list(_documents(issue_ids))
+    
+    if connection.vendor == 'postgresql':
+        # Columns get the tsvector weights A-D in COLUMN_WEIGHTS order
+        document = ' || '.join(
+            f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', %s), '{label}')" for label in 'ABCD'
+        )
+        sql = (
+            f"INSERT INTO {SEARCH_TABLE}(issue_id, document) VALUES (%s, {document}) "
+            "ON CONFLICT (issue_id) DO UPDATE SET document = EXCLUDED.document"
+        )
+    else:
+        sql = (
+            f"INSERT OR REPLACE INTO {SEARCH_TABLE}(rowid, title, description, address, comments) "
+            "VALUES (%s, %s, %s, %s, %s)"
+        )
+    
+    def write_documents():
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, documents)
+    
+    database.atomic_with_retry(write_documents, using=connection.alias)
+
+
+def remove_issue(issue_pk):
+    """Drop an issue from the index"""
+    connection = _connection()
+    if not is_supported(connection):
+        return
+    column = 'issue_id' if connection.vendor == 'postgresql' else 'rowid'
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE {column} = %s", [issue_pk])
+
+
+def rebuild(chunk_size=2000):
+    """Re-index every issue"""
+    connection = _connection()
+    if not is_supported(connection):
+        return 0
+    create_index(connection.alias)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    
+    count = 0
+    last_pk = 0
+    while True:
+        pks = list(
+            Issue.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not pks:
+            break
+        index_issues(pks)
+        count += len(pks)
+        last_pk = pks[-1]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"ANALYZE {SEARCH_TABLE}")
+        else:
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+    return count
+
+
+def search(queryset, query, limit=20, after=None):
+    """
+    Rank issues from queryset against a free-text query
+    
+    Args:
+        queryset: Issue queryset restricting the candidates (filters apply)
+        query: Free text entered by the user
+        limit: Maximum number of results
+        after: (id, score) of the last result of the previous page
+    
+    Returns:
+        List of (issue_id, score) tuples, best match first. Lower scores rank
+        higher; the score is None when the database has no ranked index.
+    
+    Pages resume from the score of the previous page's last result rather
+    than from a snapshot. Scores depend on the whole index (BM25 uses
+    corpus-wide term statistics), so issues or comments written between
+    two page loads can move results across the page boundary: a result may
+    then be skipped or shown twice. Search pages are a browsing aid, not a
+    way to enumerate every match.
+    """
+    connection = connections[queryset.db]
+    if not is_supported(connection):
+        return _search_fallback(queryset, query, limit, after)
+    
+    if connection.vendor == 'postgresql':
+        match = build_tsquery(query)
+        if not match:
+            return []
+        # Negated so that, as with BM25, lower scores rank higher
+        score = f"(-ts_rank('{_rank_weights()}', document, terms)::float8)"
+        id_column = candidate_column = 'issue_id'
+        sql = (
+            f"SELECT issue_id, {score} AS score FROM {SEARCH_TABLE}, "
+            f"to_tsquery('{TEXT_SEARCH_CONFIG}', %s) AS terms WHERE document @@ terms"
+        )
+    else:
+        match = build_match(query)
+        if not match:
+            return []
+        weights = ', '.join(str(weight) for _, weight in COLUMN_WEIGHTS)
+        score = f"bm25({SEARCH_TABLE}, {weights})"
+        id_column = 'rowid'
+        # The unary + keeps SQLite from pushing the IN list into FTS5, which
+        # would re-run the full-text query once per candidate
+        candidate_column = '+rowid'
+        sql = f"SELECT rowid, {score} AS score FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s"
+    
+    params = [match]
+    if queryset.query.where:
+        candidates, candidate_params = queryset.order_by().values('pk').query.sql_with_params()
+        sql += f" AND {candidate_column} IN ({candidates})"
+        params += candidate_params
+    if after is not None:
+        sql += f" AND ({score} > %s OR ({score} = %s AND {id_column} > %s))"
+        params += [after[1], after[1], after[0]]
+    sql += f" ORDER BY score, {id_column} LIMIT %s"
+    params.append(limit)
+    
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def _search_fallback(queryset, query, limit, after):
+    terms = TERM_RE.findall(query or '')[:MAX_TERMS]
+    if not terms:
+        return []
+    for term in terms:
+        queryset = queryset.filter(
+            Q(title__icontains=term) | Q(description__icontains=term) | Q(address__icontains=term)
+            | Q(comments__text__icontains=term, comments__is_toxic=False)
+        )
+    queryset = queryset.distinct().order_by('pk')
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after[0])
+    return [(pk, None) for pk in queryset.values_list('pk', flat=True)[:limit]]
+
+
+def search_issues(queryset, query, limit=20, after=None):
+    """
+    Like search(), but returns the Issue objects in rank order
+    
+    Each issue gets a `search_score` attribute. The second value is the
+    (id, score) position to pass as `after` for the next page, or None.
+    """
+    hits = search(queryset, query, limit + 1, after)
+    next_after = hits[limit - 1] if len(hits) > limit else None
+    hits = hits[:limit]
+    objects = queryset.in_bulk([pk for pk, _ in hits])
+    issues = []
+    for pk, score in hits:
+        issue = objects.get(pk)
+        if issue is None:
+            # Deleted without signals (e.g. raw SQL); rebuild_search_index clears these
+            continue
+        issue.search_score = score
+        issues.append(issue)
+    return issues, next_after
+
+
+def encode_position(position):
+    """Cursor token for the (id, score) position of the last result"""
+    return encode_cursor(*position) if position else None
+
+
+def decode_position(token):
+    """Decode a cursor token from encode_position, raising InvalidCursor"""
+    pk, score = decode_cursor(token, 2)
+    if not isinstance(pk, int) or not (score is None or isinstance(score, (int, float))):
+        raise InvalidCursor('Malformed cursor')
+    return pk, score
@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Issue, IssueUpdate, Comment
+from . import ai, caching, search, stats, sync
+
+
+def sync_similarity_index(pk, category, text, is_open, previous_category=None):
+    """Keep the issue in its category index only while it is open"""
+    if previous_category and previous_category != category:
+        ai.get_similarity_index(previous_category).remove(pk)
+    if is_open:
+        ai.get_similarity_index(category).add(pk, text)
+    else:
+        ai.get_similarity_index(category).remove(pk)
+
+
+@receiver(pre_save, sender=Issue)
+def issue_saving(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Remember the stored state so post_save can apply only the difference
+    instance._previous_state = None
+    if instance.pk:
+        instance._previous_state = (
+            Issue.objects.filter(pk=instance.pk).values(*stats.TRACKED_FIELDS, 'assigned_to_id').first()
+        )
+
+
+@receiver(post_save, sender=Issue)
+def issue_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_state', None)
+    stats.apply_change(previous, stats.snapshot(instance))
+    search.index_issues([instance.pk])
+    sync.record_issue_change(instance, previous and previous['assigned_to_id'])
+    
+    scopes = caching.issue_scopes(instance.category, instance.status)
+    if previous:
+        scopes |= caching.issue_scopes(previous['category'], previous['status'])
+    caching.invalidate(scopes)
+    
+    args = (
+        instance.pk, instance.category, instance.similarity_text, instance.is_open,
+        previous and previous['category'],
+    )
+    transaction.on_commit(lambda: sync_similarity_index(*args))
+
+
+@receiver(post_delete, sender=Issue)
+def issue_deleted(sender, instance, **kwargs):
+    stats.apply_change(stats.snapshot(instance), None)
+    search.remove_issue(instance.pk)
+    sync.record_issue_change(instance, instance.assigned_to_id, deleted=True)
+    caching.invalidate(caching.issue_scopes(instance.category, instance.status))
+    
+    pk, category = instance.pk, instance.category
+    transaction.on_commit(lambda: ai.get_similarity_index(category).remove(pk))
+
+
+def issue_child_changed(model, instance, deleted):
+    """Invalidate cached pages and log the change of an update or comment"""
+    issue = (
+        Issue.objects.filter(pk=instance.issue_id)
+        .values('issue_id', 'category', 'status', 'assigned_to_id').first()
+    )
+    if issue is None:
+        return
+    caching.invalidate(caching.issue_scopes(issue['category'], issue['status']))
+    sync.record_child_change(model, instance, issue, deleted=deleted)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, raw=False, signal=None, **kwargs):
+    if raw:
+        return
+    search.index_issues([instance.issue_id])
+    issue_child_changed('comment', instance, deleted=signal is post_delete)
+
+
+@receiver(post_save, sender=IssueUpdate)
+@receiver(post_delete, sender=IssueUpdate)
+def issue_update_changed(sender, instance, raw=False, signal=None, **kwargs):
+    if raw:
+        return
+    issue_child_changed('issueupdate', instance, deleted=signal is post_delete)
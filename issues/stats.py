@@ -0,0 +1,137 @@
+"""
+Precomputed issue statistics
+Counters in IssueStat and DailyIssueStat are updated incrementally from
+Issue signals, so dashboards read a handful of rows regardless of table size
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Issue, IssueStat, DailyIssueStat
+
+TRACKED_FIELDS = ('status', 'category', 'urgency_level', 'created_at', 'resolved_at')
+
+
+def snapshot(issue):
+    """Return the tracked field values of an issue instance"""
+    return {field: getattr(issue, field) for field in TRACKED_FIELDS}
+
+
+def contributions(state):
+    """
+    Counter deltas a single issue contributes to the rollups
+    
+    Returns:
+        Tuple of (stats, daily) Counters keyed by (dimension, key, column)
+        and (date, category, column)
+    """
+    stats = Counter()
+    daily = Counter()
+    if state is None:
+        return stats, daily
+    
+    stats['total', '', 'count'] += 1
+    stats['status', state['status'], 'count'] += 1
+    stats['category', state['category'], 'count'] += 1
+    stats['urgency', state['urgency_level'], 'count'] += 1
+    category = state['category']
+    daily[timezone.localdate(state['created_at']), category, 'opened'] += 1
+    
+    if state['status'] == 'resolved' and state['resolved_at']:
+        days = (state['resolved_at'] - state['created_at']).days
+        stats['resolution_days', '', 'count'] += 1
+        stats['resolution_days', '', 'value_sum'] += days
+        resolved_on = timezone.localdate(state['resolved_at'])
+        daily[resolved_on, category, 'resolved'] += 1
+        daily[resolved_on, category, 'resolution_days_sum'] += days
+    return stats, daily
+
+
+def _group(counter):
+    groups = {}
+    for (*key, column), value in counter.items():
+        if value:
+            groups.setdefault(tuple(key), {})[column] = value
+    return groups
+
+
+def apply_change(old_state, new_state):
+    """Apply the difference between two issue states to the rollup tables"""
+    old_stats, old_daily = contributions(old_state)
+    new_stats, new_daily = contributions(new_state)
+    stats = Counter(new_stats)
+    stats.subtract(old_stats)
+    daily = Counter(new_daily)
+    daily.subtract(old_daily)
+    _apply(stats, daily)
+
+
+def apply_created(states):
+    """Add many new issue states at once, e.g. after a bulk_create"""
+    stats = Counter()
+    daily = Counter()
+    for state in states:
+        issue_stats, issue_daily = contributions(state)
+        stats.update(issue_stats)
+        daily.update(issue_daily)
+    _apply(stats, daily)
+
+
+def _apply(stats, daily):
+    with transaction.atomic():
+        for (dimension, key), columns in _group(stats).items():
+            IssueStat.objects.get_or_create(dimension=dimension, key=key)
+            IssueStat.objects.filter(dimension=dimension, key=key).update(
+                **{column: F(column) + value for column, value in columns.items()}
+            )
+        for (date, category), columns in _group(daily).items():
+            DailyIssueStat.objects.get_or_create(date=date, category=category)
+            DailyIssueStat.objects.filter(date=date, category=category).update(
+                **{column: F(column) + value for column, value in columns.items()}
+            )
+
+
+def rebuild(chunk_size=2000):
+    """Recompute all rollups from the Issue table"""
+    stats = Counter()
+    daily = Counter()
+    for state in Issue.objects.values(*TRACKED_FIELDS).iterator(chunk_size=chunk_size):
+        issue_stats, issue_daily = contributions(state)
+        stats.update(issue_stats)
+        daily.update(issue_daily)
+    
+    with transaction.atomic():
+        IssueStat.objects.all().delete()
+        DailyIssueStat.objects.all().delete()
+        IssueStat.objects.bulk_create(
+            IssueStat(dimension=dimension, key=key, **columns)
+            for (dimension, key), columns in _group(stats).items()
+        )
+        DailyIssueStat.objects.bulk_create(
+            DailyIssueStat(date=date, category=category, **columns)
+            for (date, category), columns in _group(daily).items()
+        )
+
+
+def get_summary():
+    """
+    Read all counters in one query
+    
+    Returns:
+        Dict with total, by_status, by_category and by_urgency counts and
+        the average resolution time in days
+    """
+    summary = {'total': 0, 'by_status': {}, 'by_category': {}, 'by_urgency': {}, 'avg_resolution_days': 0}
+    resolution_count = resolution_sum = 0
+    for stat in IssueStat.objects.filter(count__gt=0):
+        if stat.dimension == 'total':
+            summary['total'] = stat.count
+        elif stat.dimension == 'resolution_days':
+            resolution_count, resolution_sum = stat.count, stat.value_sum
+        else:
+            summary[f'by_{stat.dimension}'][stat.key] = stat.count
+    if resolution_count:
+        summary['avg_resolution_days'] = resolution_sum / resolution_count
+    return summary
@@ -0,0 +1,272 @@
+"""
+Delta sync for field workers
+Changes to issues assigned to a worker (and to their updates and comments)
+are appended to ChangeLogEntry by the signal handlers. Clients keep the
+sequence number of the last change they applied and ask only for newer
+entries, so a sync costs in proportion to what changed.
+
+This relies on entries becoming visible in sequence order: a reader that
+has seen entry N must never later find a new entry below N. SQLite runs
+one write transaction at a time, so it holds there. On PostgreSQL,
+concurrent transactions can commit their sequence numbers out of order,
+so writers take a transaction-level advisory lock before logging and
+keep it until they commit. Other databases are not supported.
+"""
+from django.db import connections, router, transaction
+from django.db.models import Max
+
+from .models import ChangeLogEntry, Comment, Issue, IssueUpdate
+
+SYNC_DEFAULT_LIMIT = 500
+SYNC_MAX_LIMIT = 2000
+
+# Order in which a snapshot sends rows: issues before their children
+SNAPSHOT_MODELS = ('issue', 'issueupdate', 'comment')
+
+# PostgreSQL advisory lock that serializes change log writers
+LOG_LOCK_KEY = 0x53594E43
+
+
+class ResyncRequired(Exception):
+    """Raised when the log no longer reaches back to the client's position"""
+
+
+def _entry(assignee_id, model, object_id, issue_uuid, action):
+    return ChangeLogEntry(
+        assignee_id=assignee_id, model=model, object_id=object_id, issue_uuid=issue_uuid, action=action,
+    )
+
+
+def _write_entries(entries):
+    """Insert log entries; on PostgreSQL, hold the log lock until the transaction ends"""
+    if not entries:
+        return
+    using = router.db_for_write(ChangeLogEntry)
+    with transaction.atomic(using=using):
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [LOG_LOCK_KEY])
+        ChangeLogEntry.objects.using(using).bulk_create(entries)
+
+
+def record_issue_change(issue, previous_assignee_id=None, deleted=False):
+    """
+    Log a saved or deleted issue for its current and previous assignee
+    
+    When an issue moves to a new worker, its updates and comments are
+    logged for them too so their device receives the full issue; the
+    previous worker gets a tombstone.
+    """
+    entries = []
+    assignee_id = None if deleted else issue.assigned_to_id
+    if previous_assignee_id and previous_assignee_id != assignee_id:
+        entries.append(_entry(previous_assignee_id, 'issue', issue.pk, issue.issue_id, 'delete'))
+    if assignee_id:
+        entries.append(_entry(assignee_id, 'issue', issue.pk, issue.issue_id, 'upsert'))
+        if previous_assignee_id != assignee_id:
+            for model, queryset in (('issueupdate', issue.updates.all()), ('comment', issue.comments.all())):
+                entries.extend(
+                    _entry(assignee_id, model, pk, issue.issue_id, 'upsert')
+                    for pk in queryset.values_list('pk', flat=True)
+                )
+    _write_entries(entries)
+
+
+def record_created_issues(issues):
+    """Log new assigned issues created without signals, e.g. by bulk_create"""
+    _write_entries([
+        _entry(issue.assigned_to_id, 'issue', issue.pk, issue.issue_id, 'upsert')
+        for issue in issues if issue.assigned_to_id
+    ])
+
+
+def record_saved_children(model, instances, issue_states):
+    """
+    Log IssueUpdates/Comments saved without signals, e.g. by bulk_create or bulk_update
+    
+    Rows the assignee can no longer see are sent as tombstones by
+    changes_since().
+    
+    Args:
+        issue_states: Dict of issue pk to {'issue_id', 'assigned_to_id'}
+    """
+    entries = []
+    for instance in instances:
+        state = issue_states[instance.issue_id]
+        if state['assigned_to_id']:
+            entries.append(_entry(state['assigned_to_id'], model, instance.pk, state['issue_id'], 'upsert'))
+    _write_entries(entries)
+
+
+def record_child_change(model, instance, issue_state, deleted=False):
+    """Log a saved or deleted IssueUpdate/Comment of an assigned issue"""
+    if issue_state and issue_state['assigned_to_id']:
+        _write_entries([_entry(
+            issue_state['assigned_to_id'], model, instance.pk, issue_state['issue_id'],
+            'delete' if deleted else 'upsert',
+        )])
+
+
+def _photo_url(fieldfile):
+    return fieldfile.url if fieldfile else None
+
+
+def serialize_issue(issue):
+    return {
+        'id': str(issue.issue_id),
+        'title': issue.title,
+        'category': issue.category,
+        'description': issue.description,
+        'status': issue.status,
+        'urgency_level': issue.urgency_level,
+        'address': issue.address,
+        'latitude': float(issue.latitude) if issue.latitude else None,
+        'longitude': float(issue.longitude) if issue.longitude else None,
+        'photo_before': _photo_url(issue.photo_before),
+        'created_at': issue.created_at.isoformat(),
+        'updated_at': issue.updated_at.isoformat(),
+    }
+
+
+def serialize_update(update):
+    return {
+        'id': update.pk,
+        'issue': str(update.issue.issue_id),
+        'status': update.status,
+        'comment': update.comment,
+        'user': update.user.username,
+        'photo_after': _photo_url(update.photo_after),
+        'timestamp': update.timestamp.isoformat(),
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'issue': str(comment.issue.issue_id),
+        'user': comment.user.username,
+        'text': comment.text,
+        'created_at': comment.created_at.isoformat(),
+        'updated_at': comment.updated_at.isoformat(),
+    }
+
+
+SERIALIZERS = {'issue': serialize_issue, 'issueupdate': serialize_update, 'comment': serialize_comment}
+
+
+def _visible(model, user_id):
+    """Rows of a model the user may see"""
+    if model == 'issue':
+        return Issue.objects.filter(assigned_to_id=user_id)
+    if model == 'issueupdate':
+        return IssueUpdate.objects.filter(issue__assigned_to_id=user_id).select_related('issue', 'user')
+    return Comment.objects.filter(issue__assigned_to_id=user_id, is_toxic=False).select_related('issue', 'user')
+
+
+def _visible_objects(model, pks, user_id):
+    """Current rows the user may still see, keyed by pk"""
+    return {row.pk: SERIALIZERS[model](row) for row in _visible(model, user_id).filter(pk__in=pks)}
+
+
+def _change(seq, model, object_id, issue_uuid, data):
+    key = str(issue_uuid) if model == 'issue' else object_id
+    change = {'seq': seq, 'model': model, 'id': key, 'action': 'upsert' if data else 'delete'}
+    if data:
+        change['data'] = data
+    else:
+        change['issue'] = str(issue_uuid)
+    return change
+
+
+def current_position():
+    """Sequence number of the newest log entry"""
+    return ChangeLogEntry.objects.aggregate(seq=Max('seq'))['seq'] or 0
+
+
+def snapshot(user_id, after=None, limit=SYNC_DEFAULT_LIMIT):
+    """
+    One page of the full state of the user's assigned issues for a first sync
+    
+    Rows are sent model by model in primary key order, so each page is an
+    index range scan whatever the size of the snapshot.
+    
+    Args:
+        after: (position, model, pk) returned by the previous page, or None
+            to start
+    
+    Returns:
+        (changes, cursor, has_more) where cursor is (position, model, pk) to
+        continue the snapshot with while has_more is true, and then
+        (position,), the sequence to continue with changes_since()
+    """
+    if after is None:
+        # Read the position first; changes made while the snapshot is read
+        # are sent again by changes_since(), which clients apply idempotently
+        position, model, last_pk = current_position(), SNAPSHOT_MODELS[0], 0
+    else:
+        position, model, last_pk = after
+    changes = []
+    for model in SNAPSHOT_MODELS[SNAPSHOT_MODELS.index(model):]:
+        remaining = limit - len(changes)
+        rows = list(_visible(model, user_id).filter(pk__gt=last_pk).order_by('pk')[:remaining + 1])
+        for row in rows[:remaining]:
+            data = SERIALIZERS[model](row)
+            issue_uuid = data['id'] if model == 'issue' else data['issue']
+            changes.append(_change(position, model, row.pk, issue_uuid, data))
+        if len(rows) > remaining:
+            last_pk = rows[remaining - 1].pk if remaining else last_pk
+            return changes, (position, model, last_pk), True
+        last_pk = 0
+    return changes, (position,), False
+
+
+def changes_since(user_id, since, limit=SYNC_DEFAULT_LIMIT):
+    """
+    Changes for the user after sequence number `since`
+    
+    Several changes to the same row within a page are collapsed into its
+    latest state. Upserts for rows the user can no longer see (deleted,
+    hidden or reassigned since) are sent as tombstones.
+    
+    Returns:
+        (changes, position, has_more)
+    
+    Raises:
+        ResyncRequired: if entries after `since` have been pruned
+    """
+    oldest = ChangeLogEntry.objects.order_by('seq').values_list('seq', flat=True).first()
+    if oldest is not None and since < oldest - 1:
+        raise ResyncRequired()
+    
+    entries = list(
+        ChangeLogEntry.objects.filter(assignee_id=user_id, seq__gt=since).order_by('seq')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        return [], since, False
+    
+    latest = {}
+    for entry in entries:
+        latest.pop((entry.model, entry.object_id), None)
+        latest[entry.model, entry.object_id] = entry
+    
+    objects = {}
+    for model, _ in ChangeLogEntry.MODEL_CHOICES:
+        pks = [entry.object_id for entry in latest.values() if entry.model == model and entry.action == 'upsert']
+        objects[model] = _visible_objects(model, pks, user_id) if pks else {}
+    
+    changes = [
+        _change(entry.seq, entry.model, entry.object_id, entry.issue_uuid,
+                objects[entry.model].get(entry.object_id) if entry.action == 'upsert' else None)
+        for entry in latest.values()
+    ]
+    return changes, entries[-1].seq, has_more
+
+
+def prune(before):
+    """Delete entries older than `before`, always keeping the newest one"""
+    newest = current_position()
+    deleted, _ = ChangeLogEntry.objects.filter(created_at__lt=before, seq__lt=newest).delete()
+    return deleted
@@ -0,0 +1,347 @@
+"""
+Synthetic issues, status updates and comments for benchmarks
+Generates reproducible data at production-like scale: reports cluster
+around city centres with a Gaussian spread (a few are scattered or have no
+coordinates), categories, statuses and urgencies follow a realistic mix,
+and some reports are near-duplicates of earlier ones nearby. Issues are
+created with bulk.import_issues(), so statistics, search, sync log and
+similarity indexes match what the site would have built; the status
+history and comments are then added in bulk for the new issues.
+"""
+from collections import deque
+from datetime import timedelta
+import math
+import random
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import User
+from . import bulk, caching, search, sync
+from .models import Comment, Issue, IssueUpdate
+
+USERNAME_PREFIX = 'bench_'
+PASSWORD = 'benchmark'
+
+# (city, latitude, longitude, spread in km, share of reports)
+CITIES = [
+    ('Bengaluru', 12.9716, 77.5946, 10, 0.30),
+    ('Mumbai', 19.0760, 72.8777, 12, 0.25),
+    ('Delhi', 28.6139, 77.2090, 15, 0.20),
+    ('Chennai', 13.0827, 80.2707, 8, 0.10),
+    ('Pune', 18.5204, 73.8567, 7, 0.10),
+    ('Jaipur', 26.9124, 75.7873, 6, 0.05),
+]
+# Reports scattered over the country and reports without coordinates
+SCATTERED_SHARE = 0.03
+SCATTERED_BOX = (8.0, 68.0, 32.0, 90.0)
+UNLOCATED_SHARE = 0.05
+
+# Reports repeating a recent report with small changes, within ~200 m
+DUPLICATE_SHARE = 0.05
+DUPLICATE_WINDOW = 500
+DUPLICATE_JITTER_DEGREES = 0.0015
+
+CATEGORY_WEIGHTS = {
+    'pothole': 25, 'garbage': 20, 'street_light': 15, 'water_leak': 10,
+    'drainage': 10, 'road_damage': 10, 'electricity': 5, 'other': 5,
+}
+STATUS_WEIGHTS = {
+    'pending': 30, 'reviewed': 12, 'assigned': 10, 'in_progress': 13, 'resolved': 30, 'rejected': 5,
+}
+URGENCY_WEIGHTS = {'low': 30, 'medium': 50, 'high': 20}
+
+# Statuses an issue passes through before reaching its current one
+WORKFLOW = ['pending', 'reviewed', 'assigned', 'in_progress', 'resolved']
+ASSIGNED_STATUSES = {'assigned', 'in_progress', 'resolved'}
+
+# Reports are spread over this many days, more of them recent
+HISTORY_DAYS = 365
+MAX_RESOLUTION_DAYS = 30
+MAX_COMMENTS = 50
+
+TITLES = {
+    'pothole': ['Large pothole', 'Deep pothole in the lane', 'Potholes after the rain', 'Pothole near the junction'],
+    'garbage': ['Garbage not collected', 'Overflowing bin', 'Waste dumped on the footpath', 'Garbage pile attracting stray dogs'],
+    'street_light': ['Street light not working', 'Flickering street light', 'Dark stretch, lights out', 'Street light on during the day'],
+    'water_leak': ['Water pipe leaking', 'Burst water main', 'Drinking water leakage', 'Leak flooding the road'],
+    'drainage': ['Blocked drain', 'Open drain overflowing', 'Sewage backing up', 'Drain cover missing'],
+    'road_damage': ['Road surface broken', 'Road caved in', 'Speed breaker damaged', 'Road dug up and left open'],
+    'electricity': ['Exposed electric wires', 'Transformer sparking', 'Fallen power line', 'Frequent power cuts'],
+    'other': ['Fallen tree blocking road', 'Broken bench in the park', 'Stray cattle on the road', 'Illegal hoarding'],
+}
+DETAILS = {
+    'pothole': ['Two-wheelers swerve to avoid it.', 'It fills with water and cannot be seen at night.',
+                'A scooter fell here yesterday.', 'It has been growing for weeks.'],
+    'garbage': ['Nobody has collected it for a week.', 'The smell reaches the nearby houses.',
+                'It blocks half the footpath.', 'Crows and dogs spread it across the road.'],
+    'street_light': ['The whole stretch is dark after 7 pm.', 'Women avoid walking here at night.',
+                     'It has not worked for ten days.', 'Two lights on the same pole are out.'],
+    'water_leak': ['Clean water has been running for two days.', 'The road is always wet and slippery.',
+                   'Houses nearby get low pressure.', 'The leak is getting bigger.'],
+    'drainage': ['Water stands on the road after every rain.', 'Mosquitoes are breeding in it.',
+                 'Dirty water enters the shops.', 'The smell is unbearable.'],
+    'road_damage': ['Buses have to slow down to a crawl.', 'The edge has broken away.',
+                    'Loose gravel is spread over the lane.', 'It is dangerous for cyclists.'],
+    'electricity': ['Children play close by.', 'Sparks fly when it rains.',
+                    'It is an emergency hazard.', 'Several complaints to the helpline went unanswered.'],
+    'other': ['It has been like this for days.', 'Pedestrians have to walk on the road.',
+              'Traffic backs up during peak hours.', 'Please send someone to look at it.'],
+}
+LANDMARKS = ['the bus stop', 'the school gate', 'the temple', 'the market', 'the metro station',
+             'the hospital', 'the park entrance', 'the petrol pump']
+STREETS = ['MG Road', 'Station Road', 'Main Road', 'Temple Street', 'Lake View Road', 'Church Street',
+           'Market Road', 'Ring Road', '1st Cross', '2nd Main', 'Gandhi Nagar Road', 'Nehru Street']
+UPDATE_COMMENTS = {
+    'reviewed': 'Complaint verified by the ward office.',
+    'assigned': 'Assigned to the field team.',
+    'in_progress': 'Work has started on site.',
+    'resolved': 'Work completed and checked.',
+    'rejected': 'Not under municipal jurisdiction.',
+}
+COMMENTS = [
+    'Same problem on our street too.', 'Any update on this?', 'Still not fixed.',
+    'Thanks for reporting this.', 'I almost had an accident here.', 'This has been going on for weeks.',
+    'The team came by today.', 'It got worse after the rain.', 'Please fix this soon.',
+    'Looks better now, thank you.',
+]
+
+
+def ensure_users(citizens, workers):
+    """
+    Create the benchmark citizens, workers and admin that do not exist yet
+    
+    All of them share the password PASSWORD, hashed once.
+    
+    Returns:
+        Tuple of (citizen usernames, worker usernames)
+    """
+    citizen_names = [f'{USERNAME_PREFIX}citizen_{number:05d}' for number in range(citizens)]
+    worker_names = [f'{USERNAME_PREFIX}worker_{number:03d}' for number in range(workers)]
+    wanted = [(name, 'citizen') for name in citizen_names] + [(name, 'worker') for name in worker_names]
+    wanted.append((f'{USERNAME_PREFIX}admin', 'admin'))
+    
+    existing = set(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('username', flat=True))
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        [
+            User(username=name, role=role, password=password, is_staff=role == 'admin',
+                 email=f'{name}@example.com')
+            for name, role in wanted if name not in existing
+        ],
+        batch_size=bulk.DEFAULT_BATCH_SIZE,
+    )
+    return citizen_names, worker_names
+
+
+class Generator:
+    """Reproducible stream of synthetic import rows and their child rows"""
+    
+    def __init__(self, seed, citizens, workers, now=None):
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.citizens = citizens
+        self.workers = workers
+        self.now = now or timezone.now()
+        self.recent = deque(maxlen=DUPLICATE_WINDOW)
+        self.cities = [city[:4] for city in CITIES]
+        self.city_shares = [city[4] for city in CITIES]
+    
+    def choose(self, weights):
+        return self.random.choices(list(weights), list(weights.values()))[0]
+    
+    def location(self):
+        """(latitude, longitude, city) or (None, None, city) for unlocated reports"""
+        roll = self.random.random()
+        name, latitude, longitude, spread_km = self.random.choices(self.cities, self.city_shares)[0]
+        if roll < UNLOCATED_SHARE:
+            return None, None, name
+        if roll < UNLOCATED_SHARE + SCATTERED_SHARE:
+            south, west, north, east = SCATTERED_BOX
+            return self.random.uniform(south, north), self.random.uniform(west, east), name
+        # One degree of latitude is ~111 km; longitude shrinks with latitude
+        latitude += self.random.gauss(0, spread_km / 111)
+        longitude += self.random.gauss(0, spread_km / (111 * math.cos(math.radians(latitude))))
+        return latitude, longitude, name
+    
+    def text(self, category):
+        titles, details = TITLES[category], DETAILS[category]
+        title = self.random.choice(titles)
+        description = ' '.join(
+            [f'{title} near {self.random.choice(LANDMARKS)}.'] + self.random.sample(details, 2)
+        )
+        return title, description
+    
+    def timeline(self, status):
+        """created_at, updated_at and resolved_at for an issue with this status"""
+        # Squaring skews the ages towards recent reports
+        created_at = self.now - timedelta(days=HISTORY_DAYS * self.random.random() ** 2)
+        handled = timedelta()
+        if status != 'pending':
+            handled = timedelta(days=self.random.uniform(0.1, MAX_RESOLUTION_DAYS))
+        updated_at = min(created_at + handled, self.now)
+        return created_at, updated_at, updated_at if status == 'resolved' else None
+    
+    def row(self):
+        """One import row (see bulk.FIELDS)"""
+        rng = self.random
+        status = self.choose(STATUS_WEIGHTS)
+        if self.recent and rng.random() < DUPLICATE_SHARE:
+            original = rng.choice(self.recent)
+            category, title = original['category'], original['title']
+            description = f"{original['description']} {rng.choice(DETAILS[category])}"
+            address = original['address']
+            latitude = longitude = None
+            if original['latitude'] is not None:
+                latitude = original['latitude'] + rng.uniform(-1, 1) * DUPLICATE_JITTER_DEGREES
+                longitude = original['longitude'] + rng.uniform(-1, 1) * DUPLICATE_JITTER_DEGREES
+        else:
+            category = self.choose(CATEGORY_WEIGHTS)
+            title, description = self.text(category)
+            latitude, longitude, city = self.location()
+            address = f'{rng.randint(1, 400)}, {rng.choice(STREETS)}, {city}'
+        
+        created_at, updated_at, resolved_at = self.timeline(status)
+        row = {
+            'issue_id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'title': title,
+            'category': category,
+            'description': description,
+            'address': address,
+            'latitude': round(latitude, 6) if latitude is not None else None,
+            'longitude': round(longitude, 6) if longitude is not None else None,
+            'status': status,
+            'urgency_level': self.choose(URGENCY_WEIGHTS),
+            'user': rng.choice(self.citizens),
+            'assigned_to': rng.choice(self.workers) if status in ASSIGNED_STATUSES and self.workers else '',
+            'created_at': created_at,
+            'updated_at': updated_at,
+            'resolved_at': resolved_at,
+        }
+        self.recent.append(row)
+        return row
+    
+    def rows(self, count):
+        for _ in range(count):
+            yield self.row()
+    
+    def children(self, issue, citizen_ids, worker_ids, comments_per_issue):
+        """
+        Status history and comments for a created issue
+        
+        Args:
+            issue: Dict with pk, issue_id, status, assigned_to_id,
+                created_at and updated_at
+        
+        Returns:
+            Tuple of (IssueUpdates, Comments), not saved
+        """
+        # Seeded per issue, so the result does not depend on batch boundaries
+        rng = random.Random(f"{self.seed}:{issue['issue_id']}")
+        status = issue['status']
+        if status == 'rejected':
+            steps = ['reviewed', 'rejected']
+        else:
+            steps = WORKFLOW[1:WORKFLOW.index(status) + 1]
+        
+        start, end = issue['created_at'], max(issue['updated_at'], issue['created_at'])
+        handler_id = issue['assigned_to_id'] or (rng.choice(worker_ids) if worker_ids else None)
+        updates = []
+        if handler_id:
+            for number, step in enumerate(steps, 1):
+                updates.append(IssueUpdate(
+                    issue_id=issue['pk'], user_id=handler_id, status=step, comment=UPDATE_COMMENTS[step],
+                    assigned_to_id=issue['assigned_to_id'] if step == 'assigned' else None,
+                    timestamp=start + (end - start) * number / len(steps),
+                ))
+        
+        # Geometric distribution: most issues get none or a few, some many
+        comments = []
+        more = comments_per_issue / (1 + comments_per_issue)
+        while len(comments) < MAX_COMMENTS and rng.random() < more:
+            created_at = start + (self.now - start) * rng.random()
+            comments.append(Comment(
+                issue_id=issue['pk'], user_id=rng.choice(citizen_ids), text=rng.choice(COMMENTS),
+                created_at=created_at, updated_at=created_at,
+            ))
+        return updates, comments
+
+
+CHILD_ISSUE_FIELDS = ('pk', 'issue_id', 'category', 'status', 'assigned_to_id', 'created_at', 'updated_at')
+
+
+def _write_children(generator, issues, citizen_ids, worker_ids, comments_per_issue):
+    updates, comments = [], []
+    for issue in issues:
+        issue_updates, issue_comments = generator.children(issue, citizen_ids, worker_ids, comments_per_issue)
+        updates.extend(issue_updates)
+        comments.extend(issue_comments)
+    
+    issue_states = {issue['pk']: issue for issue in issues}
+    with transaction.atomic():
+        bulk.bulk_create_keeping_timestamps(IssueUpdate, updates, ('timestamp',))
+        bulk.bulk_create_keeping_timestamps(Comment, comments)
+        sync.record_saved_children('issueupdate', updates, issue_states)
+        sync.record_saved_children('comment', comments, issue_states)
+        scopes = set()
+        for issue in issues:
+            scopes |= caching.issue_scopes(issue['category'], issue['status'])
+        caching.invalidate(scopes)
+    # Comments are part of the search documents
+    search.index_issues({comment.issue_id for comment in comments})
+    return len(updates), len(comments)
+
+
+def seed(issues, seed=0, citizens=None, workers=None, comments_per_issue=1.5,
+         batch_size=bulk.DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Add synthetic issues with their status history and comments
+    
+    Issue IDs come from the seeded random generator, so running again with
+    the same seed and count adds nothing, and a larger count adds only the
+    missing issues.
+    
+    Args:
+        issues: Number of issues to generate
+        seed: Random seed
+        citizens: Reporters and commenters to spread the data over
+            (default: one per 20 issues, between 10 and 10,000)
+        workers: Field workers issues are assigned to (default 25)
+        comments_per_issue: Mean number of comments per issue
+        batch_size: Rows per transaction
+        progress: Called with (stage, count done) after each batch
+    
+    Returns:
+        Dict with the number of issues, updates and comments created
+    """
+    if citizens is None:
+        citizens = min(max(issues // 20, 10), 10000)
+    if workers is None:
+        workers = 25
+    citizen_names, worker_names = ensure_users(citizens, workers)
+    citizen_ids = list(User.objects.filter(username__in=citizen_names).values_list('pk', flat=True))
+    worker_ids = list(User.objects.filter(username__in=worker_names).values_list('pk', flat=True))
+    generator = Generator(seed, citizen_names, worker_names)
+    
+    last_pk = Issue.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    created = bulk.import_issues(generator.rows(issues), batch_size=batch_size)['created']
+    if progress:
+        progress('issues', created)
+    
+    # Issues are created in pk order, so the new ones follow the old maximum
+    result = {'issues': created, 'updates': 0, 'comments': 0}
+    while True:
+        batch = list(
+            Issue.objects.filter(pk__gt=last_pk).order_by('pk').values(*CHILD_ISSUE_FIELDS)[:batch_size]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1]['pk']
+        updates, comments = _write_children(generator, batch, citizen_ids, worker_ids, comments_per_issue)
+        result['updates'] += updates
+        result['comments'] += comments
+        if progress:
+            progress('children', result['updates'] + result['comments'])
+    return result
@@ -0,0 +1,137 @@
+"""
+Background tasks for work that should not block the request/response cycle
+Tasks run on an in-process thread pool once the surrounding transaction commits
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Issue
+from . import ai, postgres
+from .images import warm_thumbnails
+from .routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ISSUE_TASK_WORKERS,
+                thread_name_prefix='issue-tasks',
+            )
+        return _executor
+
+
+def _run(func, *args, **kwargs):
+    try:
+        # Tasks follow a commit; replicas may not have the new rows yet
+        with use_primary():
+            func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', func.__name__)
+
+
+def _run_in_worker(func, *args, **kwargs):
+    try:
+        _run(func, *args, **kwargs)
+    finally:
+        # Worker threads hold their own connections; reuse them for CONN_MAX_AGE
+        # and drop broken ones between tasks
+        close_old_connections()
+
+
+def run_task(func, *args, **kwargs):
+    """
+    Run a task in the background after the current transaction commits
+    
+    With ISSUE_TASKS_EAGER the task runs synchronously instead, which is
+    useful in tests and management commands.
+    """
+    def submit():
+        if settings.ISSUE_TASKS_EAGER:
+            _run(func, *args, **kwargs)
+        else:
+            get_executor().submit(_run_in_worker, func, *args, **kwargs)
+    transaction.on_commit(submit)
+
+
+def find_duplicate_candidates(issue):
+    """
+    Find open issues in the same category that may duplicate this one
+    
+    Located issues are only compared with open issues nearby; issues
+    without coordinates are compared on text alone, on PostgreSQL with the
+    issues a trigram index finds similar.
+    
+    Returns:
+        List of dicts with issue_id, similarity and distance_km
+    """
+    open_issues = Issue.objects.filter(
+        category=issue.category,
+        status__in=Issue.OPEN_STATUSES,
+    ).exclude(id=issue.id)
+    
+    distances = None
+    if issue.latitude is not None and issue.longitude is not None:
+        nearby = open_issues.within_radius(
+            issue.latitude, issue.longitude, ai.DuplicateDetector.MAX_DISTANCE_KM
+        )
+        distances = dict(nearby.values_list('id', 'distance_km'))
+        if not distances:
+            return []
+    
+    candidate_ids = distances
+    if distances is None:
+        # Rather than score the whole category, let the trigram index pick
+        # the issues worth scoring on PostgreSQL
+        candidate_ids = postgres.trigram_candidates(open_issues, issue.similarity_text)
+        if candidate_ids == []:
+            return []
+    
+    matches = ai.DuplicateDetector.find_similar_indexed(
+        issue.similarity_text, issue.category,
+        exclude_ids=[issue.id], candidate_ids=candidate_ids,
+    )
+    # The index may briefly lag behind the database, so confirm each match
+    issue_ids = dict(
+        open_issues.filter(id__in=[pk for pk, _ in matches]).values_list('id', 'issue_id')
+    )
+    return [
+        {
+            'issue_id': str(issue_ids[pk]),
+            'similarity': round(similarity, 4),
+            'distance_km': round(distances[pk], 3) if distances else None,
+        }
+        for pk, similarity in matches
+        if pk in issue_ids
+    ]
+
+
+def analyze_issue(issue_pk):
+    """Suggest a priority and look for duplicates, storing results on the issue"""
+    issue = Issue.objects.filter(pk=issue_pk).first()
+    if issue is None:
+        return
+    
+    Issue.objects.filter(pk=issue_pk).update(
+        suggested_priority=ai.PriorityClassifier.suggest_priority(issue.title, issue.description),
+        duplicate_candidates=find_duplicate_candidates(issue),
+        ai_processed_at=timezone.now(),
+    )
+
+
+def generate_issue_thumbnails(issue_pk):
+    """Pre-generate thumbnails so the first page view does not pay for them"""
+    issue = Issue.objects.filter(pk=issue_pk).only('photo_before').first()
+    if issue is not None:
+        warm_thumbnails(issue.photo_before)
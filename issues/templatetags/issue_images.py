@@ -0,0 +1,10 @@
+from django import template
+from issues.images import thumbnail_url as _thumbnail_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_url(fieldfile, width):
+    """Usage: <img src="{% thumbnail_url issue.photo_before 640 %}">"""
+    return _thumbnail_url(fieldfile, int(width))
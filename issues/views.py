@@ -1,20 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.db.models import Q, Min, Max, OuterRef, Subquery
 from django.http import JsonResponse
 from .models import Issue, IssueUpdate, Comment, IssuePhoto
 from .forms import IssueCreateForm, IssueUpdateForm, CommentForm, IssueFilterForm
-from .ai_utils import DuplicateDetector, ToxicityFilter, PriorityClassifier
+from . import ai, caching, search
+from .instrumentation import query_budget
+from .tasks import run_task, analyze_issue, generate_issue_thumbnails
+from .stats import get_summary as get_issue_summary
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter, parse_datetime_value
 from accounts.models import User
 
 
+@query_budget(4)
+@caching.cached_view(caching.all_issues)
 def home_view(request):
     """Home page with overview"""
     recent_issues = Issue.objects.all()[:6]
-    resolved_count = Issue.objects.filter(status='resolved').count()
-    pending_count = Issue.objects.filter(status='pending').count()
-    total_count = Issue.objects.count()
+    summary = get_issue_summary()
+    resolved_count = summary['by_status'].get('resolved', 0)
+    pending_count = summary['by_status'].get('pending', 0)
+    total_count = summary['total']
     
     context = {
         'recent_issues': recent_issues,
@@ -25,9 +32,48 @@ def home_view(request):
     return render(request, 'issues/home.html', context)
 
 
+ISSUE_LIST_PAGE_SIZE = 24
+
+# Keyset orderings for the sort_by choices; each is backed by the issue list indexes
+ISSUE_LIST_SORTS = {
+    '-created_at': ('-created_at', '-id'),
+    'created_at': ('created_at', 'id'),
+    '-urgency_level': ('-urgency_rank', '-created_at', '-id'),
+}
+
+
+def _issue_list_page(issues, ordering, cursor):
+    """Return one keyset page of issues and the cursor of the next page"""
+    issues = issues.order_by(*ordering)
+    if cursor:
+        try:
+            values = decode_cursor(cursor, len(ordering))
+            for position, field in enumerate(ordering):
+                if field.lstrip('-') == 'created_at':
+                    values[position] = parse_datetime_value(values[position])
+                elif not isinstance(values[position], int):
+                    raise InvalidCursor('Malformed cursor')
+            issues = issues.filter(keyset_filter(ordering, values))
+        except InvalidCursor:
+            # Stale or tampered links fall back to the first page
+            pass
+    
+    page = list(issues[:ISSUE_LIST_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(page) > ISSUE_LIST_PAGE_SIZE:
+        page = page[:ISSUE_LIST_PAGE_SIZE]
+        last = page[-1]
+        next_cursor = encode_cursor(*(getattr(last, field.lstrip('-')) for field in ordering))
+    return page, next_cursor
+
+
+@query_budget(4)
+@caching.cached_view(caching.filtered_issues)
 def issue_list_view(request):
-    """List all issues with filters"""
+    """List issues with filters, or ranked search results when q is given"""
     issues = Issue.objects.all()
+    ordering = ISSUE_LIST_SORTS['-created_at']
+    query = None
     
     # Apply filters
     filter_form = IssueFilterForm(request.GET)
@@ -36,23 +82,44 @@ def issue_list_view(request):
         status = filter_form.cleaned_data.get('status')
         urgency = filter_form.cleaned_data.get('urgency')
         sort_by = filter_form.cleaned_data.get('sort_by') or '-created_at'
+        query = filter_form.cleaned_data.get('q')
         
         if category:
             issues = issues.filter(category=category)
         if status:
             issues = issues.filter(status=status)
+        ordering = ISSUE_LIST_SORTS[sort_by]
         if urgency:
-            issues = issues.filter(urgency_level=urgency)
-        
-        issues = issues.order_by(sort_by)
+            issues = issues.filter(urgency_rank=Issue.URGENCY_RANKS[urgency])
+            # Sorting on a column fixed by the filter only confuses the planner
+            ordering = tuple(field for field in ordering if field != '-urgency_rank')
+    
+    after = request.GET.get('after')
+    if query:
+        try:
+            position = search.decode_position(after) if after else None
+        except InvalidCursor:
+            position = None
+        issues, next_position = search.search_issues(issues, query, ISSUE_LIST_PAGE_SIZE, position)
+        next_cursor = search.encode_position(next_position)
+    else:
+        issues, next_cursor = _issue_list_page(issues, ordering, after)
+    
+    next_query = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['after'] = next_cursor
+        next_query = params.urlencode()
     
     context = {
         'issues': issues,
         'filter_form': filter_form,
+        'next_query': next_query,
     }
     return render(request, 'issues/issue_list.html', context)
 
 
+@query_budget(2)
 @login_required
 def issue_create_view(request):
     """Create new issue"""
@@ -61,61 +128,18 @@ def issue_create_view(request):
         if form.is_valid():
             issue = form.save(commit=False)
             issue.user = request.user
-            
-            # AI: Suggest priority
-            suggested_priority = PriorityClassifier.suggest_priority(
-                issue.title, issue.description
-            )
-            if suggested_priority != issue.urgency_level:
-                messages.info(
-                    request, 
-                    f'AI suggests priority: {suggested_priority.upper()}. You selected: {issue.urgency_level.upper()}'
-                )
-            
             issue.save()
             
-            # Handle additional photos
-            additional_photos = request.FILES.getlist('additional_photos')
-            for photo in additional_photos:
-                IssuePhoto.objects.create(issue=issue, photo=photo)
-            
-            # AI: Check for duplicates
-            similar_text = f"{issue.title} {issue.description}"
-            existing_issues = Issue.objects.filter(
-                category=issue.category,
-                status__in=['pending', 'reviewed', 'assigned', 'in_progress']
-            ).exclude(id=issue.id)
-            
-            existing_data = [
-                {
-                    'text': f"{i.title} {i.description}",
-                    'id': i.id,
-                    'issue_id': str(i.issue_id),
-                    'lat': i.latitude,
-                    'lon': i.longitude
-                }
-                for i in existing_issues
-            ]
-            
-            similar_issues = DuplicateDetector.find_similar_issues(similar_text, existing_data)
-            
-            # Check location proximity for similar issues
-            nearby_duplicates = []
-            if issue.latitude and issue.longitude:
-                for similar in similar_issues:
-                    similar_issue = similar['issue']
-                    if similar_issue['lat'] and similar_issue['lon']:
-                        if DuplicateDetector.check_location_proximity(
-                            issue.latitude, issue.longitude,
-                            similar_issue['lat'], similar_issue['lon']
-                        ):
-                            nearby_duplicates.append(similar)
+            # Uploads are stored before responding so none are lost with the
+            # process; bulk_create still saves each file to storage
+            IssuePhoto.objects.bulk_create(
+                IssuePhoto(issue=issue, photo=photo) for photo in form.cleaned_data['additional_photos']
+            )
             
-            if nearby_duplicates:
-                messages.warning(
-                    request,
-                    f'Similar issue(s) found nearby! Check issue #{nearby_duplicates[0]["issue"]["issue_id"]}'
-                )
+            # AI analysis and thumbnails are handled in the background so the
+            # response time does not depend on the size of the backlog
+            run_task(analyze_issue, issue.pk)
+            run_task(generate_issue_thumbnails, issue.pk)
             
             messages.success(request, f'Issue created successfully! Issue ID: {issue.issue_id}')
             return redirect('issue_detail', issue_id=issue.issue_id)
@@ -125,11 +149,15 @@ def issue_create_view(request):
     return render(request, 'issues/issue_create.html', {'form': form})
 
 
+@query_budget(6)
 def issue_detail_view(request, issue_id):
     """View issue details"""
-    issue = get_object_or_404(Issue, issue_id=issue_id)
-    updates = issue.updates.all()
-    comments = issue.comments.filter(is_toxic=False)
+    issue = get_object_or_404(Issue.objects.select_related('user', 'assigned_to'), issue_id=issue_id)
+    updates = issue.updates.select_related('user', 'assigned_to')
+    comments = issue.comments.filter(is_toxic=False).select_related('user')
+    duplicate_candidates = Issue.objects.filter(
+        issue_id__in=[c['issue_id'] for c in issue.duplicate_candidates]
+    )
     
     # Handle comment submission
     if request.method == 'POST' and request.user.is_authenticated:
@@ -140,7 +168,7 @@ def issue_detail_view(request, issue_id):
             comment.user = request.user
             
             # AI: Check toxicity
-            if ToxicityFilter.is_toxic(comment.text):
+            if ai.ToxicityFilter.is_toxic(comment.text):
                 comment.is_toxic = True
                 messages.error(request, 'Your comment contains inappropriate content and has been flagged.')
             else:
@@ -156,10 +184,12 @@ def issue_detail_view(request, issue_id):
         'updates': updates,
         'comments': comments,
         'comment_form': comment_form,
+        'duplicate_candidates': duplicate_candidates,
     }
     return render(request, 'issues/issue_detail.html', context)
 
 
+@query_budget(3)
 @login_required
 def my_issues_view(request):
     """View user's own issues"""
@@ -171,51 +201,81 @@ def my_issues_view(request):
     return render(request, 'issues/my_issues.html', context)
 
 
+RESOLVED_GALLERY_PAGE_SIZE = 12
+RESOLVED_GALLERY_ORDERING = ('-resolved_at', '-id')
+
+
+@query_budget(3)
+@caching.cached_view(caching.resolved_issues)
 def resolved_gallery_view(request):
     """Public gallery of resolved issues"""
-    resolved_issues = Issue.objects.filter(status='resolved').order_by('-resolved_at')
+    # Latest after photo of each issue, fetched in the same query
+    latest_after_photo = IssueUpdate.objects.filter(
+        issue=OuterRef('pk'), photo_after__isnull=False,
+    ).exclude(photo_after='').order_by('-timestamp').values('photo_after')[:1]
+    
+    resolved_issues = Issue.objects.filter(
+        status='resolved', resolved_at__isnull=False,
+    ).annotate(
+        after_photo_name=Subquery(latest_after_photo),
+    ).filter(
+        after_photo_name__isnull=False,
+    ).order_by(*RESOLVED_GALLERY_ORDERING)
     
-    # Get issues with after photos
-    issues_with_photos = []
-    for issue in resolved_issues:
-        after_update = issue.updates.filter(photo_after__isnull=False).first()
-        if after_update:
-            issues_with_photos.append({
-                'issue': issue,
-                'after_photo': after_update.photo_after
-            })
+    cursor = request.GET.get('after')
+    if cursor:
+        try:
+            resolved_at, pk = decode_cursor(cursor, 2)
+            resolved_issues = resolved_issues.filter(
+                keyset_filter(RESOLVED_GALLERY_ORDERING, [parse_datetime_value(resolved_at), int(pk)])
+            )
+        except (InvalidCursor, TypeError, ValueError):
+            return redirect('resolved_gallery')
+    
+    page = list(resolved_issues[:RESOLVED_GALLERY_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(page) > RESOLVED_GALLERY_PAGE_SIZE:
+        page = page[:RESOLVED_GALLERY_PAGE_SIZE]
+        next_cursor = encode_cursor(page[-1].resolved_at, page[-1].id)
+    
+    photo_field = IssueUpdate._meta.get_field('photo_after')
+    issues_with_photos = [
+        {
+            'issue': issue,
+            'after_photo': photo_field.attr_class(None, photo_field, issue.after_photo_name),
+        }
+        for issue in page
+    ]
     
     context = {
         'issues_with_photos': issues_with_photos,
+        'next_cursor': next_cursor,
     }
     return render(request, 'issues/resolved_gallery.html', context)
 
 
+@query_budget(3)
+@caching.cached_view(caching.all_issues)
 def map_view(request):
-    """Interactive map view of all issues"""
-    issues = Issue.objects.filter(latitude__isnull=False, longitude__isnull=False)
-    
-    # Prepare data for map
-    issues_data = []
-    for issue in issues:
-        issues_data.append({
-            'id': str(issue.issue_id),
-            'title': issue.title,
-            'category': issue.get_category_display(),
-            'status': issue.status,
-            'urgency': issue.urgency_level,
-            'lat': float(issue.latitude),
-            'lng': float(issue.longitude),
-            'address': issue.address,
-        })
+    """Interactive map view; markers are loaded per viewport from the map API"""
+    bounds = Issue.objects.filter(
+        latitude__isnull=False, longitude__isnull=False
+    ).aggregate(
+        south=Min('latitude'), west=Min('longitude'),
+        north=Max('latitude'), east=Max('longitude'),
+    )
     
     context = {
-        'issues_data': issues_data,
+        'bounds': [
+            [float(bounds['south']), float(bounds['west'])],
+            [float(bounds['north']), float(bounds['east'])],
+        ] if bounds['south'] is not None else None,
     }
     return render(request, 'issues/map.html', context)
 
 
 # Admin Views
+@query_budget(4)
 @login_required
 def admin_dashboard_view(request):
     """Admin dashboard with analytics"""
@@ -223,37 +283,29 @@ def admin_dashboard_view(request):
         messages.error(request, 'Access denied. Admin only.')
         return redirect('home')
     
-    # Statistics
-    total_issues = Issue.objects.count()
-    pending_issues = Issue.objects.filter(status='pending').count()
-    in_progress_issues = Issue.objects.filter(status='in_progress').count()
-    resolved_issues = Issue.objects.filter(status='resolved').count()
-    
-    # Issues by category
-    issues_by_category = Issue.objects.values('category').annotate(count=Count('id'))
-    
-    # Issues by status
-    issues_by_status = Issue.objects.values('status').annotate(count=Count('id'))
+    # Statistics, read from the precomputed rollups
+    summary = get_issue_summary()
+    by_status = summary['by_status']
     
     # Recent issues
     recent_issues = Issue.objects.all()[:10]
     
-    # Average resolution time
-    resolved = Issue.objects.filter(status='resolved', resolved_at__isnull=False)
-    avg_resolution_days = 0
-    if resolved.exists():
-        total_days = sum([issue.resolution_time or 0 for issue in resolved])
-        avg_resolution_days = total_days / resolved.count()
-    
     context = {
-        'total_issues': total_issues,
-        'pending_issues': pending_issues,
-        'in_progress_issues': in_progress_issues,
-        'resolved_issues': resolved_issues,
-        'issues_by_category': list(issues_by_category),
-        'issues_by_status': list(issues_by_status),
+        'total_issues': summary['total'],
+        'pending_issues': by_status.get('pending', 0),
+        'in_progress_issues': by_status.get('in_progress', 0),
+        'resolved_issues': by_status.get('resolved', 0),
+        'issues_by_category': [
+            {'category': category, 'count': count}
+            for category, count in summary['by_category'].items()
+        ],
+        'issues_by_status': [
+            {'status': status, 'count': count}
+            for status, count in by_status.items()
+        ],
         'recent_issues': recent_issues,
-        'avg_resolution_days': round(avg_resolution_days, 1),
+        'avg_resolution_days': round(summary['avg_resolution_days'], 1),
+        'cache_stats': caching.get_stats(),
     }
     return render(request, 'issues/admin_dashboard.html', context)
 